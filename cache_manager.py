@@ -0,0 +1,213 @@
+"""Bounded, observable cache of the app's derived results.
+
+Results are cached per process in namespaces ('figures', 'indices', ...),
+each with a budget in bytes. The size of a result is estimated when it is
+stored (numpy buffers, pandas memory usage, Plotly figure data, containers
+recursively), and the least recently used entries of a namespace are evicted
+once it goes over its budget.
+
+Functions whose last argument is the version (hash) of the source they read
+are cached with ``versioned=True``: storing the result for a new version
+drops the result for the old one, so a replaced source file doesn't leave
+stale results behind.
+
+Hits, misses and evictions are counted per namespace and per function and
+shown by ``namespace_report``, ``function_report`` and ``entry_report``,
+and at the bottom of the app when ``FIMX_CACHE_ADMIN=1``.
+Budgets can be overridden in MB with ``FIMX_CACHE_BUDGETS``, e.g.
+``figures=128,indices=64``.
+"""
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+MB = 1 << 20
+
+# Budget of each namespace, in bytes
+BUDGETS = {
+    'derived': 64 * MB,     # frames derived from the sources
+    'masks': 16 * MB,       # sidebar filter masks
+    'indices': 128 * MB,    # indicator matrices, index rankings, similarity indices
+    'projections': 16 * MB,
+    'figures': 64 * MB,
+    'values': 32 * MB,      # tables and totals shown next to the figures
+    'reports': 16 * MB,     # data validation reports
+    'snapshots': 256 * MB,  # uploaded releases
+    'diffs': 128 * MB,
+    'datasets': 16 * MB,    # Parquet panel datasets
+}
+
+# Longest argument list shown per entry in the report
+ARGUMENTS_WIDTH = 120
+
+MISSING = object()
+
+Entry = collections.namedtuple('Entry', ['value', 'size', 'created', 'hits'])
+
+
+class Namespace:
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        # key without its version -> key of the entry of the current version
+        self.versions = {}
+        # function -> [hits, misses, evictions]
+        self.calls = collections.defaultdict(lambda: [0, 0, 0])
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry.size
+        if self.versions.get(key[:-1]) == key:
+            del self.versions[key[:-1]]
+        return entry
+
+
+def admin_enabled():
+    # The app shows the cache tables to operators only
+    return os.environ.get('FIMX_CACHE_ADMIN', '0') == '1'
+
+
+def budget_overrides():
+    overrides = {}
+    for item in filter(None, os.environ.get('FIMX_CACHE_BUDGETS', '').split(',')):
+        name, megabytes = item.split('=')
+        if name.strip() not in BUDGETS:
+            raise ValueError(f'FIMX_CACHE_BUDGETS: unknown cache namespace {name.strip()!r}')
+        overrides[name.strip()] = int(float(megabytes) * MB)
+    return overrides
+
+
+_namespaces = {name: Namespace(name, budget) for name, budget in {**BUDGETS, **budget_overrides()}.items()}
+_lock = threading.Lock()
+
+
+def sizeof(value):
+    # Estimated bytes held by value
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, 'to_plotly_json'):
+        # Plotly figures: to_plotly_json() would deep-copy the properties
+        return sizeof(value._data) + sizeof(value._layout)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    return sys.getsizeof(value)
+
+
+def lookup(namespace, key):
+    # key[0] names the function; returns MISSING when key isn't cached
+    with _lock:
+        space = _namespaces[namespace]
+        entry = space.entries.get(key)
+        calls = space.calls[key[0]]
+        if entry is None:
+            calls[1] += 1
+            return MISSING
+        calls[0] += 1
+        space.entries[key] = entry._replace(hits=entry.hits + 1)
+        space.entries.move_to_end(key)
+        return entry.value
+
+
+def store(namespace, key, value, versioned=False):
+    size = sizeof(value)
+    with _lock:
+        space = _namespaces[namespace]
+        if key in space.entries:
+            space.remove(key)
+        if versioned:
+            previous = space.versions.get(key[:-1])
+            if previous is not None:
+                space.remove(previous)
+            space.versions[key[:-1]] = key
+        space.entries[key] = Entry(value, size, time.time(), 0)
+        space.size += size
+        # The entry just stored is kept even when it alone is over the budget
+        while space.size > space.budget and len(space.entries) > 1:
+            evicted = next(iter(space.entries))
+            space.remove(evicted)
+            space.calls[evicted[0]][2] += 1
+
+
+def cached(namespace, versioned=False):
+    # Memoizes a function of hashable positional arguments in namespace
+    if namespace not in _namespaces:
+        raise ValueError(f'unknown cache namespace {namespace!r}')
+
+    def decorator(fn):
+        name = f'{fn.__module__}.{fn.__name__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            key = (name,) + args
+            value = lookup(namespace, key)
+            if value is MISSING:
+                value = fn(*args)
+                store(namespace, key, value, versioned)
+            return value
+        return wrapper
+    return decorator
+
+
+def clear(namespace=None):
+    with _lock:
+        for space in _namespaces.values():
+            if namespace in (None, space.name):
+                space.entries.clear()
+                space.versions.clear()
+                space.size = 0
+
+
+def hit_rate(hits, misses):
+    return hits / (hits + misses) if hits + misses else np.nan
+
+
+def namespace_report():
+    with _lock:
+        rows = []
+        for space in _namespaces.values():
+            hits, misses, evictions = np.sum(list(space.calls.values()) or [[0, 0, 0]], axis=0)
+            rows.append((space.name, len(space.entries), space.size / MB, space.budget / MB,
+                         hits, misses, hit_rate(hits, misses), evictions))
+    return pd.DataFrame(rows, columns=['namespace', 'entries', 'MB', 'budget MB', 'hits', 'misses',
+                                       'hit rate', 'evictions']).set_index('namespace')
+
+
+def function_report():
+    with _lock:
+        rows = []
+        for space in _namespaces.values():
+            sizes = collections.Counter()
+            counts = collections.Counter()
+            for key, entry in space.entries.items():
+                sizes[key[0]] += entry.size
+                counts[key[0]] += 1
+            for function, (hits, misses, evictions) in space.calls.items():
+                rows.append((space.name, function, counts[function], sizes[function] / MB,
+                             hits, misses, hit_rate(hits, misses), evictions))
+    return pd.DataFrame(rows, columns=['namespace', 'function', 'entries', 'MB', 'hits', 'misses',
+                                       'hit rate', 'evictions'])
+
+
+def entry_report():
+    # One row per cached result, largest first
+    now = time.time()
+    with _lock:
+        rows = [(space.name, key[0], repr(key[1:])[:ARGUMENTS_WIDTH], entry.size / MB, entry.hits,
+                 now - entry.created)
+                for space in _namespaces.values() for key, entry in space.entries.items()]
+    return pd.DataFrame(rows, columns=['namespace', 'function', 'arguments', 'MB', 'hits', 'age (s)']) \
+        .sort_values('MB', ascending=False, ignore_index=True)
@@ -0,0 +1,298 @@
+import hashlib
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import cache_manager
+import shared_cache
+
+# Every CSV the app reads lives next to this file
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SOURCE_FILES = {
+    'state': 'State-Level_Consolidated_Dataset.csv',
+    'municipal': 'Municipal-Level_Consolidated_Dataset.csv',
+    'historical': 'Base_de_Datos_de_Inclusion_Financiera_202406 - Hoja 1.csv',
+    'card_brands': 'Consulta_20241224-151312014 - Analysis.csv',
+    'transactions_total': 'Transacciones_totales.csv',
+    'transactions_credit': 'Transacciones_credito.csv',
+    'transactions_debit': 'Transacciones_debito.csv',
+}
+
+
+def source_path(name):
+    return os.path.join(DATA_DIR, SOURCE_FILES[name])
+
+
+def read_state(path):
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    percentage_columns = [col for col in df.columns if col.startswith('%')]
+    for col in percentage_columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].str.replace(',', '.').astype(float)
+        else:
+            df[col] = df[col].astype(float)
+    df.set_index('Estado', inplace=True)
+    # Filter out "Sin identificar"
+    df = df[df.index != 'Sin identificar']
+    return df
+
+
+def read_municipal(path):
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    # Municipality names repeat across states, so key rows by their INEGI code
+    df.set_index('Clave_Municipio', inplace=True)
+    return df
+
+
+def read_raw(path):
+    return pd.read_csv(path)
+
+
+def to_number(series):
+    # The raw CSVs store many numbers as '1,234' or '12.5%'
+    if series.dtype.kind in 'biuf':
+        return series.astype(float)
+    text = series.astype(str).str.replace(',', '', regex=False).str.rstrip('%')
+    return pd.to_numeric(text, errors='coerce')
+
+
+SOURCE_READERS = {
+    'state': read_state,
+    'municipal': read_municipal,
+    'historical': read_raw,
+    'card_brands': read_raw,
+    'transactions_total': read_raw,
+    'transactions_credit': read_raw,
+    'transactions_debit': read_raw,
+}
+
+# The large frames are shared between all app processes on the host through
+# memory-mapped files; the small transaction tables stay private per process.
+SHARED_SOURCES = ['state', 'municipal', 'historical']
+
+
+def source_hash(name):
+    digest = hashlib.sha256()
+    with open(source_path(name), 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def reader_hash(name):
+    # Changing a reader's cleanup invalidates the shared copies it produced
+    # Hash of the source text: code object reprs hold memory addresses, which
+    # would give every process its own version
+    return hashlib.sha256(inspect.getsource(SOURCE_READERS[name]).encode()).hexdigest()[:8]
+
+
+def load_source(name):
+    path = source_path(name)
+    reader = SOURCE_READERS[name]
+    _source_versions[name] = source_hash(name)
+    if name in SHARED_SOURCES:
+        version = f'{_source_versions[name]}-{reader_hash(name)}'
+        return shared_cache.attach(name, version, lambda: reader(path))
+    return reader(path)
+
+
+# Parsed sources live for the lifetime of the server process; Streamlit reruns
+# re-execute app.py but keep imported modules, so reruns never touch the disk.
+_sources = {}
+_source_versions = {}
+_sources_lock = threading.Lock()
+
+
+def load_all_sources():
+    with _sources_lock:
+        if not _sources:
+            # pandas' CSV parser releases the GIL, so a thread pool overlaps the reads
+            with ThreadPoolExecutor(max_workers=len(SOURCE_READERS)) as pool:
+                futures = {
+                    name: pool.submit(load_source, name)
+                    for name in SOURCE_READERS
+                }
+                loaded = {name: future.result() for name, future in futures.items()}
+            _sources.update(loaded)
+    return _sources
+
+
+def get_source(name):
+    # Cached frames are shared by every session: treat them as read-only
+    return load_all_sources()[name]
+
+
+def source_version(name):
+    # Hash of the source file the cached frame was parsed from
+    load_all_sources()
+    return _source_versions[name]
+
+
+# Indicator groups shared by the state-level sections
+INFRASTRUCTURE_COLUMNS = [
+    'Sucursales_banca_comercial_10mil_adultos',
+    'Cajeros_10mil_adultos',
+    'Corresponsales_10mil_adultos'
+]
+
+ACCOUNT_COLUMNS = [
+    'Cuentas_Nivel1_10mil_adultos_Banca',
+    'Cuentas_Nivel2_10mil_adultos_Banca',
+    'Cuentas_Nivel3_10mil_adultos_Banca',
+    'Cuentas_cuentas_transaccionales_tradicionales_10mil_adultos_Banca'
+]
+
+CREDIT_COLUMNS = [
+    'Creditos_hipotecarios_10mil_adultos_Banca',
+    'Creditos_personales_10mil_adultos_Banca',
+    'Creditos_nomina_10mil_adultos_Banca',
+    'Creditos_automotrices_10mil_adultos_Banca',
+    'Creditos_ABCD_10mil_adultos_Banca'
+]
+
+INSTITUTION_COLUMNS = [
+    'Sucursales_banca_comercial_10mil_adultos',
+    'Sucursales_banca_desarrollo_10mil_adultos',
+    'Sucursales_cooperativas_10mil_adultos',
+    'Sucursales_microfinancieras_10mil_adultos'
+]
+
+# Per 10,000 adults indicators published for both states and municipalities,
+# named as in the municipal file
+INDICATOR_COLUMNS = [
+    'Sucursales_banca_comercial_10mil_adultos',
+    'Sucursales_banca_desarrollo_10mil_adultos',
+    'Sucursales_cooperativas_10mil_adultos',
+    'Sucursales_microfinancieras_10mil_adultos',
+    'Total_sucursales_10mil_adultos',
+    'Corresponsales_10mil_adultos',
+    'Cajeros_10mil_adultos',
+    'TPV_10mil_adultos',
+    'Establecimientos_con_TPV_10mil_adultos',
+    'Contratos_celular_10mil_adultos',
+    'Cuentas_deposito_ahorro_10mil_adultos_EACP',
+    'Cuentas_deposito_a_la_vista_10mil_adultos_EACP',
+    'Cuentas_deposito_a_plazo_10mil_adultos_EACP',
+    'Tarjeta_debito_10mil_adultos_EACP',
+    'Cuentas_credito_al_consumo_10mil_adultos_EACP',
+    'Cuentas_credito_a_la_vivienda_10mil_adultos_EACP',
+    'Cuentas_Nivel1_10mil_adultos_Banca',
+    'Cuentas_Nivel2_10mil_adultos_Banca',
+    'Cuentas_Nivel3_10mil_adultos_Banca',
+    'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca',
+    'Cuentas_ahorro_10mil_adultos_Banca',
+    'Cuentas_depositos_plazo_10mil_adultos_Banca',
+    'Tarjetas_debito_10mil_adultos_Banca',
+    'Tarjetas_credito_10mil_adultos_Banca',
+    'Creditos_hipotecarios_10mil_adultos_Banca',
+    'Creditos_grupales_10mil_adultos_Banca',
+    'Creditos_personales_10mil_adultos_Banca',
+    'Creditos_nomina_10mil_adultos_Banca',
+    'Creditos_automotrices_10mil_adultos_Banca',
+    'Creditos_ABCD_10mil_adultos_Banca',
+    'Transacciones_en_TPV_10mil_adultos_Banca',
+    'Transacciones_en_Cajeros_10mil_adultos_Banca'
+]
+
+# The state file spells a few of them differently
+STATE_INDICATOR_ALIASES = {
+    'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca':
+        'Cuentas_cuentas_transaccionales_tradicionales_10mil_adultos_Banca'
+}
+
+YEAR_COL = "Periodo_Año"
+QUARTER_COL = "Periodo_Trimestre"
+
+
+def build_state_indicators(sources):
+    df = sources['state'].copy()
+    df['Adult_Population_Percentage'] = df['Poblacion_adulta'] / df['Poblacion'] * 100
+    df['Superficie_km2'] = df['Superficie_km2'].fillna(df['Superficie_km2'].median())
+    df['Mobile_Banking_Penetration'] = df['Contratos_celular_10mil_adultos'] / 10000
+    df['Total_Branches'] = df[INSTITUTION_COLUMNS].sum(axis=1)
+    return df
+
+
+def build_historical_year_end(sources):
+    df = sources['historical']
+    # Keep one row per year: 4T, except 2024 which only has data up to 2T
+    is_year_end = df[QUARTER_COL] == "4T"
+    is_year_end[df[YEAR_COL] == 2024] = df[QUARTER_COL] == "2T"
+    return df[is_year_end].reset_index(drop=True)
+
+
+def build_historical_trends(sources):
+    df_filtered = get_derived('historical_year_end').sort_values(by=YEAR_COL)
+    # Convert year to string for categorical x-axis in bar charts
+    df_filtered[YEAR_COL] = df_filtered[YEAR_COL].astype(str)
+    return df_filtered
+
+
+# Women/men columns of the historical file for debit (AU, AV) and credit (AX, AY) cards
+GENDER_CARD_COLUMNS = {'debit': (46, 47), 'credit': (49, 50)}
+
+
+def build_gender_cards(sources):
+    df_gender = get_derived('historical_year_end')
+    cards = {}
+    for kind, (women_idx, men_idx) in GENDER_CARD_COLUMNS.items():
+        data = pd.DataFrame({
+            'Year': df_gender[YEAR_COL],
+            'Women': df_gender.iloc[:, women_idx].str.replace(',', '').astype(float),
+            'Men': df_gender.iloc[:, men_idx].str.replace(',', '').astype(float)
+        })
+        # Filter from 2018 onwards and sort
+        data = data[data['Year'] >= 2018].sort_values('Year')
+        data['Total'] = data['Men'] + data['Women']
+        data['Men %'] = (data['Men'] / data['Total'] * 100).round(1)
+        data['Women %'] = (data['Women'] / data['Total'] * 100).round(1)
+        cards[kind] = data
+    return cards
+
+
+DERIVED_BUILDERS = {
+    'state_indicators': build_state_indicators,
+    'historical_year_end': build_historical_year_end,
+    'historical_trends': build_historical_trends,
+    'gender_cards': build_gender_cards,
+}
+
+_derived_lock = threading.RLock()
+
+
+@cache_manager.cached('derived')
+def _derived_frame(name):
+    return DERIVED_BUILDERS[name](load_all_sources())
+
+
+def get_derived(name):
+    # Derived frames are built once per process on top of the cached sources
+    with _derived_lock:
+        return _derived_frame(name)
+
+
+# Earlier quarterly municipal releases live in the Parquet panel of panel.py,
+# which reads its sources through this module and is only imported when used
+
+def municipal_periods():
+    # Periods stored in the panel; none without releases or without pyarrow
+    import panel
+    return panel.periods() if panel.available() else []
+
+
+def municipal_release_version(period):
+    # Changes whenever the panel does
+    import panel
+    return panel.release_version(period)
+
+
+def municipal_release(period):
+    # One period of the panel, indexed by INEGI key like the municipal source
+    import panel
+    return panel.release(period)
@@ -0,0 +1,128 @@
+"""Chunked CSV and Parquet exports of the cached frames.
+
+Exports are generators of ``bytes`` that serialize a few thousand rows at a
+time straight from the cached (possibly memory-mapped) frame, optionally
+restricted to a set of row positions and columns, so serializing a whole
+consolidated dataset never builds a full copy of the frame or one giant
+string.
+
+The finished file is still held in memory once per download: Streamlit's
+``download_button`` reads a ``ChunkStream`` to the end with ``read()`` and
+keeps the result in its in-memory media storage, so peak memory per download
+is the size of the exported file.
+"""
+import functools
+import importlib.util
+import io
+
+# Rows serialized per chunk (and per Parquet row group)
+CHUNK_ROWS = 5000
+
+MIME_TYPES = {'CSV': 'text/csv', 'Parquet': 'application/vnd.apache.parquet'}
+EXTENSIONS = {'CSV': 'csv', 'Parquet': 'parquet'}
+
+
+@functools.lru_cache(maxsize=None)
+def formats():
+    # Parquet export is optional; pyarrow is only imported when it is used
+    return ['CSV', 'Parquet'] if importlib.util.find_spec('pyarrow') is not None else ['CSV']
+
+
+def column_positions(df, columns):
+    return slice(None) if columns is None else df.columns.get_indexer(columns)
+
+
+def row_slices(df, rows, columns, chunk_rows):
+    # Successive row blocks of df's columns; slices of the cached frame where possible
+    n_rows = len(df) if rows is None else len(rows)
+    positions = column_positions(df, columns)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        yield df.iloc[start:stop, positions] if rows is None else df.iloc[rows[start:stop], positions]
+
+
+def csv_chunks(df, rows=None, columns=None, chunk_rows=CHUNK_ROWS):
+    yield df.iloc[:0, column_positions(df, columns)].to_csv().encode('utf-8')
+    for chunk in row_slices(df, rows, columns, chunk_rows):
+        yield chunk.to_csv(header=False).encode('utf-8')
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file collecting what the Parquet writer emits until drained
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_chunks(df, rows=None, columns=None, chunk_rows=CHUNK_ROWS):
+    # One row group per chunk, emitted as soon as it is written
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df if columns is None else df[columns], preserve_index=True)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in row_slices(df, rows, columns, chunk_rows):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=True))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_chunks(df, fmt, rows=None, columns=None):
+    if fmt == 'Parquet':
+        return parquet_chunks(df, rows, columns)
+    return csv_chunks(df, rows, columns)
+
+
+class ChunkStream(io.RawIOBase):
+    # Read-only file over a chunk generator, for APIs that expect a file object
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+        self.pending = memoryview(b'')
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        self.position += size
+        return size
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Only rewinding a stream that was not read yet is possible
+        if (offset, whence) != (0, io.SEEK_SET) or self.position:
+            raise io.UnsupportedOperation('ChunkStream can only be read once, from the start')
+        return 0
+
+
+def export_stream(df, fmt, rows=None, columns=None):
+    return ChunkStream(export_chunks(df, fmt, rows, columns))
+
+
+def file_name(stem, fmt):
+    return f'{stem}.{EXTENSIONS[fmt]}'
@@ -0,0 +1,762 @@
+import functools
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+
+import cache_manager
+import filters
+import labels
+import metrics
+import projections
+from data_layer import (
+    ACCOUNT_COLUMNS,
+    CREDIT_COLUMNS,
+    GENDER_CARD_COLUMNS,
+    INSTITUTION_COLUMNS,
+    YEAR_COL,
+    get_derived,
+    get_source,
+    to_number,
+)
+
+# Default-view results seeded by prerender.py, by cache key: figure JSON or a
+# plain value, decoded the first time it is asked for instead of being built
+_prerendered = {}
+
+
+def cached_result(namespace, decode):
+    # Figures only depend on the cached data and on widget values, so each
+    # combination is built once per process and reused by every session
+    def decorator(builder):
+        @functools.wraps(builder)
+        def wrapper(*args):
+            key = (builder.__name__,) + args
+            result = cache_manager.lookup(namespace, key)
+            if result is cache_manager.MISSING:
+                artifact = _prerendered.pop(key, None)
+                result = builder(*args) if artifact is None else decode(artifact)
+                cache_manager.store(namespace, key, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def seed_prerendered(figures, values):
+    # Hands over pre-rendered results (figure JSON and plain values by cache key)
+    _prerendered.update(figures)
+    _prerendered.update(values)
+
+
+cached_figure = cached_result('figures', pio.from_json)
+# Values shown next to the figures (tables, totals), cached the same way
+cached_value = cached_result('values', lambda value: value)
+
+
+def state_frame(place_filter):
+    # Derived state indicators restricted to the sidebar filter
+    return filters.apply('state', get_derived('state_indicators'), place_filter)
+
+
+# Labels of columns and categories come from the labels catalogue; figures
+# that show them take the language as their last argument
+infrastructure_metrics = {
+    'Sucursales_banca_comercial_10mil_adultos': '#1f77b4',
+    'Cajeros_10mil_adultos': '#2ca02c',
+    'Corresponsales_10mil_adultos': '#d62728'
+}
+
+institution_colors = {
+    'Sucursales_banca_comercial_10mil_adultos': '#1f77b4',
+    'Sucursales_banca_desarrollo_10mil_adultos': '#ff7f0e',
+    'Sucursales_cooperativas_10mil_adultos': '#2ca02c',
+    'Sucursales_microfinancieras_10mil_adultos': '#d62728'
+}
+
+indicators = [
+    'TPV_10mil_adultos',
+    'Sucursales_banca_comercial_10mil_adultos',
+    'Cajeros_10mil_adultos',
+    'Corresponsales_10mil_adultos',
+    'Contratos_celular_10mil_adultos'
+]
+
+VIEW_TYPES = ['Absolute numbers', 'Percentage']
+INSTITUTION_VIEWS = ['Individual institutions', 'Total branches']
+
+STACKED_LEGEND = dict(
+    orientation="v",
+    yanchor="top",
+    y=1,
+    xanchor="left",
+    x=1.02,
+    font=dict(size=10)
+)
+
+
+# 1. Population Demographics
+@cached_figure
+def population_figure(place_filter):
+    df = state_frame(place_filter)
+    fig = px.scatter(df, x='Poblacion', y='Adult_Population_Percentage',
+                     size='Superficie_km2', hover_name=df.index,
+                     labels={'Poblacion': 'total population',
+                             'Adult_Population_Percentage': 'adult population as (%)',
+                             'Superficie_km2': 'Area (km²)'},
+                     title='Population demographics by state; size represents area')
+    return fig
+
+
+# 2. Banking Infrastructure Availability
+@cached_figure
+def infrastructure_figure(selected_metric, place_filter, lang):
+    df = state_frame(place_filter)
+    fig = px.bar(df.sort_values(selected_metric, ascending=False),
+                 y=selected_metric,
+                 title=labels.text('per_10k', lang, label=labels.label(selected_metric, lang)),
+                 color_discrete_sequence=[infrastructure_metrics[selected_metric]])
+
+    fig.update_layout(
+        xaxis_title=labels.text('state', lang),
+        yaxis_title=labels.text('number_per_10k', lang),
+        height=600,
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# 3. Account Ownership by Type
+@cached_figure
+def account_figure(view_type, place_filter, lang):
+    df = state_frame(place_filter)
+    account_labels = list(labels.labels(ACCOUNT_COLUMNS, lang))
+    if view_type == 'Absolute numbers':
+        account_data_renamed = df[ACCOUNT_COLUMNS].set_axis(account_labels, axis=1)
+        fig = px.bar(
+            account_data_renamed.sort_values(account_labels[0], ascending=False),
+            y=account_labels,
+            title=labels.text('account_title', lang)
+        )
+        fig.update_layout(
+            xaxis_title=labels.text('state', lang),
+            yaxis_title=labels.text('accounts_per_10k', lang),
+            barmode='stack',
+            height=700
+        )
+    else:
+        account_data_percentage = df[ACCOUNT_COLUMNS].div(df[ACCOUNT_COLUMNS].sum(axis=1), axis=0) * 100
+        account_data_renamed = account_data_percentage.set_axis(account_labels, axis=1)
+        fig = px.bar(
+            account_data_renamed.sort_values(account_labels[0], ascending=False),
+            y=account_labels,
+            title=labels.text('account_share_title', lang)
+        )
+        fig.update_layout(
+            xaxis_title=labels.text('state', lang),
+            yaxis_title=labels.text('percentage', lang),
+            barmode='stack',
+            height=700
+        )
+
+    fig.update_layout(
+        legend=STACKED_LEGEND,
+        margin=dict(l=50, r=300, t=80, b=200),
+        xaxis_tickangle=-45,
+        height=700
+    )
+    return fig
+
+
+# 4. Credit Product Penetration
+@cached_figure
+def credit_product_figure(place_filter, lang):
+    df = state_frame(place_filter)
+    credit_labels = list(labels.labels(CREDIT_COLUMNS, lang))
+    credit_data_renamed = df[CREDIT_COLUMNS].set_axis(credit_labels, axis=1)
+    fig = px.bar(
+        credit_data_renamed.sort_values(credit_labels[0], ascending=False),
+        y=credit_labels,
+        title=labels.text('credit_title', lang)
+    )
+    fig.update_layout(
+        xaxis_title=labels.text('state', lang),
+        yaxis_title=labels.text('credits_per_10k', lang),
+        barmode='stack',
+        height=700,
+        legend=STACKED_LEGEND,
+        margin=dict(l=50, r=300, t=80, b=200),
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# 5. Mobile Banking Adoption
+@cached_figure
+def mobile_banking_figure(place_filter):
+    df = state_frame(place_filter)
+    fig = px.bar(
+        df.sort_values('Mobile_Banking_Penetration', ascending=False),
+        y='Mobile_Banking_Penetration',
+        title='Mobile banking adoption by state'
+    )
+    fig.update_layout(
+        xaxis_title='state',
+        yaxis_title='mobile banking contracts per adult',
+        height=600,
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# 6. Comparison of different financial institutions
+@cached_figure
+def institution_figure(selected_institution, place_filter, lang):
+    df = state_frame(place_filter)
+    institution_label = labels.label(selected_institution, lang)
+    fig = px.bar(df.sort_values(selected_institution, ascending=False),
+                 y=selected_institution,
+                 title=labels.text('per_10k', lang, label=institution_label),
+                 color_discrete_sequence=[institution_colors[selected_institution]],
+                 labels={
+                     selected_institution: institution_label,
+                     "variable": ""  # This removes the "Institution type" label
+                 })
+    fig.update_layout(
+        xaxis_title=labels.text('state', lang),
+        yaxis_title=labels.text('branches_per_10k', lang),
+        height=700,
+        width=1200,
+        showlegend=False,  # This hides the legend for individual view
+        margin=dict(l=50, r=300, t=80, b=200),
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+@cached_figure
+def total_branches_figure(place_filter, lang):
+    df = state_frame(place_filter)
+    # Create a new DataFrame with renamed columns for plotting
+    institution_labels = list(labels.labels(INSTITUTION_COLUMNS, lang))
+    plot_data = df[INSTITUTION_COLUMNS].set_axis(institution_labels, axis=1)
+
+    fig = px.bar(plot_data.sort_values(institution_labels[0], ascending=False),
+                 y=institution_labels,
+                 title=labels.text('total_branches_title', lang),
+                 color_discrete_map=dict(zip(institution_labels, institution_colors.values())))
+    fig.update_layout(
+        xaxis_title=labels.text('state', lang),
+        yaxis_title=labels.text('branches_per_10k', lang),
+        barmode='stack',
+        height=700,
+        legend=STACKED_LEGEND,
+        margin=dict(l=50, r=300, t=80, b=200),
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# 7. Relationships between Various Indicators and Financial Inclusion
+def state_inclusion_index(weights, normalization, place_filter):
+    df = state_frame(place_filter)
+    return df.assign(FI_Index=metrics.inclusion_index('state', weights, normalization))
+
+
+@cached_figure
+def indicator_relationship_figure(indicator, weights, normalization, place_filter, lang):
+    df = state_inclusion_index(weights, normalization, place_filter)
+    df = df.assign(Poblacion=df['Poblacion'].fillna(df['Poblacion'].median()))
+    fig = px.scatter(
+        df,
+        x=indicator,
+        y='FI_Index',
+        size='Poblacion',
+        hover_name=df.index,
+        labels={
+            indicator: labels.text('per_10k', lang, label=labels.label(indicator, lang)),
+            'FI_Index': labels.label('FI_Index', lang),
+            'Poblacion': labels.label('Poblacion', lang)
+        },
+        title=labels.text('relationship_title', lang, label=labels.label(indicator, lang))
+    )
+    return fig
+
+
+@cached_value
+def indicator_correlation(indicator, weights, normalization, place_filter):
+    df = state_inclusion_index(weights, normalization, place_filter)
+    return df[indicator].corr(df['FI_Index'])
+
+
+# 8. Top and Bottom States in Financial Inclusion
+def filtered_inclusion_index(level, weights, normalization, place_filter):
+    # Scores stay relative to the whole country; the filter only selects places
+    index = metrics.inclusion_index(level, weights, normalization)
+    if not filters.is_active(place_filter):
+        return index
+    return index[filters.matrix_mask(metrics.indicator_matrix(level), level, place_filter)]
+
+
+@cached_value
+def index_extremes(level, weights, normalization, place_filter):
+    # Top 3 and bottom 3 places of the ranking
+    ranking = filtered_inclusion_index(level, weights, normalization, place_filter)
+    return ranking.nlargest(3), ranking.nsmallest(3)
+
+
+# Municipalities are too many for one bar each; chart the best ranked only
+MUNICIPAL_INDEX_BARS = 30
+
+
+@cached_figure
+def fi_index_figure(level, weights, normalization, place_filter):
+    if level == 'state':
+        df = state_inclusion_index(weights, normalization, place_filter)
+        # Filter out "Sin identificar"
+        df_filtered = df[df.index != 'Sin identificar']
+        title = 'Financial Inclusion Index by state'
+        xaxis_title = 'State'
+    else:
+        index = filtered_inclusion_index(level, weights, normalization, place_filter)
+        df_filtered = index.nlargest(MUNICIPAL_INDEX_BARS).to_frame()
+        title = f'Financial Inclusion Index: top {MUNICIPAL_INDEX_BARS} municipalities'
+        xaxis_title = 'Municipality'
+    fig = px.bar(df_filtered.sort_values('FI_Index', ascending=False),
+                 y='FI_Index',
+                 title=title,
+                 color_discrete_sequence=['#90EE90'])  # Light green color
+
+    fig.update_layout(
+        xaxis_title=xaxis_title,
+        yaxis_title='Financial Inclusion Index',
+        height=600,
+        xaxis_tickangle=-45,
+        showlegend=False
+    )
+    return fig
+
+
+def ranking_stability_figure(stability, ranking_name):
+    data = stability.head(MUNICIPAL_INDEX_BARS).reset_index()
+    place = data.columns[0]
+    fig = px.scatter(
+        data,
+        x=place,
+        y='median rank',
+        error_y=data['p95 rank'] - data['median rank'],
+        error_y_minus=data['median rank'] - data['p5 rank'],
+        hover_data=['current rank', 'mean rank', 'P(top 3)', 'P(bottom 3)'],
+        title=f'Rank of the {len(data)} best ranked {ranking_name} under random weights (median and 90% band)'
+    )
+    fig.update_layout(
+        xaxis_title='',
+        yaxis_title='rank',
+        yaxis_autorange='reversed',
+        height=600,
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+# 9. Compare states and municipalities
+def comparison_heatmap_figure(matrix, rows, normalization, lang=labels.DEFAULT_LANGUAGE):
+    fig = px.imshow(
+        matrix.normalized[rows],
+        x=list(labels.labels(matrix.columns, lang)),
+        y=list(matrix.labels[rows]),
+        color_continuous_scale='RdBu_r' if normalization == 'z-score' else 'Viridis',
+        color_continuous_midpoint=0 if normalization == 'z-score' else None,
+        aspect='auto',
+        labels={'color': normalization},
+        title=f'Indicators per 10,000 adults ({normalization})'
+    )
+    fig.update_layout(
+        height=250 + 40 * len(rows),
+        xaxis_tickangle=-45
+    )
+    return fig
+
+
+def comparison_radar_figure(matrix, rows, normalization, lang=labels.DEFAULT_LANGUAGE):
+    n_indicators = len(matrix.columns)
+    radar_data = pd.DataFrame({
+        'value': matrix.normalized[rows].ravel(),
+        'indicator': np.tile(labels.labels(matrix.columns, lang).to_numpy(), len(rows)),
+        'place': np.repeat(matrix.labels[rows], n_indicators)
+    })
+    fig = px.line_polar(
+        radar_data,
+        r='value',
+        theta='indicator',
+        color='place',
+        line_close=True,
+        labels={'value': normalization, 'place': ''},
+        title=f'Indicator profile ({normalization})'
+    )
+    fig.update_layout(height=700)
+    return fig
+
+
+# 11. Changes since a previous release
+def release_distribution_figure(diff, column):
+    # Distribution of one column across places, previous release next to the current one
+    j = diff.columns.index(column)
+    data = pd.DataFrame({
+        'value': np.concatenate([diff.old[:, j], diff.new[:, j]]),
+        'release': np.repeat(['previous', 'current'], len(diff.keys)),
+        'place': np.tile(diff.labels, 2),
+    }).dropna(subset=['value'])
+    label = labels.label(column)
+    fig = px.box(data, x='release', y='value', color='release', points='outliers', hover_name='place',
+                 labels={'value': label, 'release': ''},
+                 title=f'Distribution of {label} across {metrics.LEVEL_LABELS[diff.level].lower()}')
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+# Historical data: one single-dropdown bar chart per series group
+@cache_manager.cached('derived')
+def historical_series_maps():
+    df_filtered = get_derived('historical_trends')
+
+    # Adjust column selections (modify indices as per your actual data structure)
+    infrastructure_cols = df_filtered.columns[3:11]
+    infra_map = {
+        "Branches": infrastructure_cols[0],
+        "ATMs": infrastructure_cols[1],
+        "POS": infrastructure_cols[2],
+        "Places with POS": infrastructure_cols[3],
+        "Banking agents (corresponsales)": infrastructure_cols[4],
+        "Mobile banking contracts": infrastructure_cols[5],
+        "Transactions in ATMs": infrastructure_cols[6],
+        "Transactions in POS": infrastructure_cols[7]
+    }
+
+    captacion_types = df_filtered.columns[11:18]
+    captacion_total = df_filtered.columns[18]
+    captacion_map = {
+        "Ahorro": captacion_types[0],
+        "Plazo": captacion_types[1],
+        "N1": captacion_types[2],
+        "N2": captacion_types[3],
+        "N3": captacion_types[4],
+        "Tradicionales": captacion_types[5],
+        "Simplificadas": captacion_types[6],
+        "Total": captacion_total
+    }
+
+    # EACP Captación mapping
+    captacion_eacp_cols = df_filtered.columns[19:23]  # Columns T to W
+    captacion_eacp_map = {
+        "Ahorro EACP": captacion_eacp_cols[0],
+        "Plazo EACP": captacion_eacp_cols[1],
+        "Otras EACP": captacion_eacp_cols[2],
+        "Total EACP": captacion_eacp_cols[3]
+    }
+
+    credit_start_col = "Crédito\nBanca_Tarjeta de crédito"
+    credit_end_col = "Crédito\nBanca_Total"
+    credit_cols = df_filtered.loc[:, credit_start_col:credit_end_col].columns[:-1]
+    credit_total_col = df_filtered.loc[:, credit_start_col:credit_end_col].columns[-1]
+
+    credit_map = {}
+    for c in credit_cols:
+        short_label = c.replace("Crédito\nBanca_", "").strip()
+        credit_map[short_label] = c
+    credit_map["Total"] = credit_total_col
+
+    # EACP Crédito: only AF to AI, with AJ as total
+    credito_eacp_cols = df_filtered.columns[31:37]  # Columns AF to AK
+    credito_eacp_map = {}
+    for c in credito_eacp_cols[0:4]:
+        short_label = c.replace("Crédito\nEACP_", "").strip() + " EACP"
+        credito_eacp_map[short_label] = c
+    credito_eacp_map["Total EACP"] = credito_eacp_cols[-2]  # Add AJ as total
+
+    return {
+        'infrastructure': infra_map,
+        'captacion': captacion_map,
+        'captacion_eacp': captacion_eacp_map,
+        'credit': credit_map,
+        'credit_eacp': credito_eacp_map,
+    }
+
+
+# Per group: (title prefix, title for the total, bar color, y-axis title)
+HISTORICAL_SECTIONS = {
+    'infrastructure': ("Infrastructure", None, "#CCCCCC", 'number of units'),
+    'captacion': ("Captación", ("Total", "Total Captación Banca"), "#1f77b4", 'number of accounts'),
+    'captacion_eacp': ("Captación EACP", ("Total EACP", "Total Captación EACP"), '#2ca02c', 'number of accounts'),
+    'credit': ("Crédito", ("Total", "Total Crédito Banca"), "#1f77b4", 'number of credits'),
+    'credit_eacp': ("Crédito", ("Total EACP", "Total Crédito EACP"), '#2ca02c', 'number of credits'),
+}
+
+
+@cached_figure
+def historical_trend_figure(section, choice):
+    df_filtered = get_derived('historical_trends')
+    title_prefix, total, color, yaxis_title = HISTORICAL_SECTIONS[section]
+    col = historical_series_maps()[section][choice]
+    if total is not None and choice == total[0]:
+        title = total[1]
+    else:
+        title = f"{title_prefix}: {choice}"
+
+    fig = px.bar(df_filtered[[YEAR_COL, col]], x=YEAR_COL, y=col,
+                 title=title,
+                 color_discrete_sequence=[color])
+    fig.update_layout(
+        xaxis_title='year',
+        yaxis_title=yaxis_title
+    )
+    if section == 'infrastructure':
+        fig.update_layout(barmode='group')
+    return fig
+
+
+# Trend projections drawn on the card line charts: a dashed line and a
+# shaded prediction interval per series; projection is (model, window) or None
+def add_projection(fig, source, name, label, color, projection):
+    model, window = projection
+    years, mean, lower, upper = projections.series_projection(source, name, model, window)
+    fig.add_scatter(x=np.concatenate([years, years[::-1]]), y=np.concatenate([upper, lower[::-1]]),
+                    fill='toself', fillcolor=color, opacity=0.2, line_width=0, hoverinfo='skip',
+                    showlegend=False, name=f'{label} (95% interval)')
+    fig.add_scatter(x=years, y=mean, mode='lines+markers', line=dict(color=color, dash='dash'),
+                    name=f'{label} ({model} trend)', customdata=np.stack([lower, upper], axis=1),
+                    hovertemplate='%{x}: %{y:,.0f} (95%: %{customdata[0]:,.0f} - %{customdata[1]:,.0f})')
+
+
+# Gender Analysis - Cards
+@cached_figure
+def gender_line_figure(kind, projection=None):
+    data = get_derived('gender_cards')[kind]
+    colors = {'Women': '#ff7f0e', 'Men': '#1f77b4'}
+    # Line chart (separate lines for men and women)
+    fig = px.line(data, x='Year', y=['Women', 'Men'],
+                  title=f'{kind.capitalize()} cards by gender over time',
+                  color_discrete_map=colors)
+    fig.update_layout(
+        xaxis_title='year',
+        yaxis_title='number of cards',
+        legend_title='gender'
+    )
+    if projection:
+        columns = get_source('historical').columns
+        for label, idx in zip(['Women', 'Men'], GENDER_CARD_COLUMNS[kind]):
+            add_projection(fig, 'historical', columns[idx], label, colors[label], projection)
+    return fig
+
+
+@cached_figure
+def gender_share_figure(kind):
+    data = get_derived('gender_cards')[kind]
+    # Stacked bar chart (percentages)
+    fig = px.bar(data, x='Year', y=['Women %', 'Men %'],
+                 title=f'{kind.capitalize()} cards by gender over time (% distribution)',
+                 color_discrete_map={'Women %': '#ff7f0e', 'Men %': '#1f77b4'})
+    fig.update_layout(
+        xaxis_title='year',
+        yaxis_title='percentage',
+        barmode='stack',
+        legend_title='gender',
+        yaxis_range=[0, 100]  # Force y-axis to be 0-100%
+    )
+    return fig
+
+
+# Cards analysis - brand distribution
+# Row of the total and of the Mastercard/Visa/other rows in the analysis file
+CARD_BRAND_ROWS = {'credit': (0, 1, 2, 3), 'debit': (4, 5, 6, 7)}
+
+
+@cached_figure
+def card_total_figure(kind, projection=None):
+    analysis_df = get_source('card_brands')
+    total_data = pd.DataFrame({
+        'Year': analysis_df.columns[1:],  # Years from 2006 to 2024
+        'Total Cards': analysis_df.iloc[CARD_BRAND_ROWS[kind][0], 1:].values
+    })
+    fig = px.line(
+        total_data,
+        x='Year',
+        y='Total Cards',
+        title=f"Total {kind} cards",
+    )
+    fig.update_layout(
+        xaxis_title="year",
+        yaxis_title="number of cards",
+        showlegend=False,
+        xaxis={'tickmode': 'linear', 'dtick': 1}  # Show all years
+    )
+    if projection:
+        name = analysis_df['Título'].iloc[CARD_BRAND_ROWS[kind][0]]
+        add_projection(fig, 'card_brands', name, 'Total Cards', '#636efa', projection)
+    return fig
+
+
+@cached_figure
+def card_brand_figure(kind, view_type):
+    analysis_df = get_source('card_brands')
+    _, mastercard_row, visa_row, other_row = CARD_BRAND_ROWS[kind]
+    brands_data = pd.DataFrame({
+        'Year': analysis_df.columns[1:],
+        'Mastercard': analysis_df.iloc[mastercard_row, 1:].values,
+        'Visa': analysis_df.iloc[visa_row, 1:].values,
+        'Other Brands': analysis_df.iloc[other_row, 1:].values
+    }).melt('Year', var_name='Brand', value_name='Cards')
+
+    if view_type == 'Percentage':
+        # Calculate percentages by year
+        brands_data['Cards'] = brands_data['Cards'].astype(float)  # Convert to float first
+        brands_data['Cards'] = (
+            brands_data['Cards'] / brands_data.groupby('Year')['Cards'].transform('sum') * 100
+        ).round(1)
+
+    # Create stacked bar chart for the distribution
+    fig = px.bar(
+        brands_data,
+        x='Year',
+        y='Cards',
+        color='Brand',
+        title=f"{kind.capitalize()} cards distribution by brand",
+        labels={
+            "Year": "year",
+            "Cards": "percentage" if view_type == 'Percentage' else "units"
+        },
+        barmode='stack',
+        color_discrete_map={
+            'Mastercard': '#FF0000',
+            'Visa': '#0066CC',
+            'Other Brands': '#808080'
+        }
+    )
+    fig.update_layout(
+        xaxis={'tickmode': 'linear', 'dtick': 1},  # Show all years
+        yaxis_ticksuffix='%' if view_type == 'Percentage' else ''
+    )
+    return fig
+
+
+# Card transactional volume ($) by category
+# Per transaction file: (source, title prefix of each category); chart titles
+# are the labels catalogue's transactions_<kind>_pie / _growth texts
+TRANSACTION_KINDS = {
+    'total': ('transactions_total', 'Total de monto operado a través de tarjetas en'),
+    'credit': ('transactions_credit', 'Monto operado a través de tarjetas de crédito en'),
+    'debit': ('transactions_debit', 'Monto operado a través de tarjetas de débito en'),
+}
+
+
+def transaction_categories(kind):
+    # Category rows of a transaction file with the category ID cut out of the title
+    source, prefix = TRANSACTION_KINDS[kind]
+    categories = get_source(source).iloc[1:]
+    return categories.assign(Category=categories['Título'].str.slice(len(prefix) + 1))
+
+
+@cached_value
+def transaction_summary(kind):
+    totals = get_source(TRANSACTION_KINDS[kind][0])
+    # Get total values (always from first row, columns 'Total 2023' and 'Total 2024 (eoy)')
+    total_2023 = float(totals.iloc[0]['Total 2023'].replace(',', ''))
+    total_2024 = float(totals.iloc[0]['Total 2024 (eoy)'].replace(',', ''))
+    delta_percentage = float(totals.iloc[0]['D% 2023 to 2024'].rstrip('%'))
+    return total_2023, total_2024, delta_percentage
+
+
+@cached_figure
+def transaction_pie_figure(kind, lang):
+    categories = transaction_categories(kind)
+    categories = pd.DataFrame({
+        'Total 2024 (B)': to_number(categories['Total 2024 (eoy)']) / 1e9,
+        'Percentage': to_number(categories['% 2024 (eoy)']),
+        'Clean Label': labels.labels(categories['Category'], lang),
+    })
+
+    fig = px.pie(
+        categories,
+        values='Total 2024 (B)',
+        names='Clean Label',
+        title=labels.text(f'transactions_{kind}_pie', lang),
+        custom_data=['Percentage']
+    )
+
+    # Hover text is formatted by plotly from the label, value and percentage
+    fig.update_traces(
+        hovertemplate=labels.text('pie_hover', lang),
+        textinfo='percent+label'
+    )
+    return fig
+
+
+@cached_figure
+def transaction_growth_figure(kind, lang):
+    categories = transaction_categories(kind)
+    growth_data = pd.DataFrame({
+        'Growth': to_number(categories['D% 2023 to 2024']),
+        'Clean Label': labels.labels(categories['Category'], lang),
+    })
+    # Remove missing values and the "Undefined" category
+    growth_data = growth_data[growth_data['Growth'].notna() & (categories['Category'] != 'No definido')]
+    growth_data = growth_data.sort_values('Growth', ascending=True)
+
+    fig = px.bar(
+        growth_data,
+        x='Growth',
+        y='Clean Label',
+        orientation='h',
+        title=labels.text(f'transactions_{kind}_growth', lang),
+        labels={"Growth": labels.text('growth', lang), "Clean Label": labels.text('category', lang)}
+    )
+
+    fig.update_traces(
+        texttemplate='%{x:.1f}%',
+        textposition='outside'
+    )
+
+    fig.update_layout(
+        xaxis_title=labels.text('growth', lang),
+        yaxis_title="",
+        showlegend=False,
+        height=800,  # Increased height to accommodate all categories
+        margin=dict(l=50, r=50, t=50, b=50)
+    )
+    return fig
+
+
+def default_figures():
+    # Every figure a fresh session renders before touching a widget
+    maps = historical_series_maps()
+    no_filter = (filters.NO_FILTER,)
+    lang = (labels.DEFAULT_LANGUAGE,)
+    builds = [
+        (population_figure, no_filter),
+        (infrastructure_figure, (list(infrastructure_metrics.keys())[0],) + no_filter + lang),
+        (account_figure, (VIEW_TYPES[0],) + no_filter + lang),
+        (credit_product_figure, no_filter + lang),
+        (mobile_banking_figure, no_filter),
+        (institution_figure, (INSTITUTION_COLUMNS[0],) + no_filter + lang),
+    ]
+    index_args = (metrics.DEFAULT_INDEX_WEIGHTS, metrics.INDEX_NORMALIZATIONS[0]) + no_filter
+    builds += [(indicator_relationship_figure, (indicator,) + index_args + lang) for indicator in indicators]
+    builds.append((fi_index_figure, ('state',) + index_args))
+    builds += [(historical_trend_figure, (section, list(maps[section].keys())[0]))
+               for section in HISTORICAL_SECTIONS]
+    for kind in ['debit', 'credit']:
+        builds += [(gender_line_figure, (kind, None)), (gender_share_figure, (kind,))]
+    for kind in ['credit', 'debit']:
+        builds += [(card_total_figure, (kind, None)), (card_brand_figure, (kind, VIEW_TYPES[0]))]
+    for kind in TRANSACTION_KINDS:
+        builds += [(transaction_pie_figure, (kind,) + lang), (transaction_growth_figure, (kind,) + lang)]
+    return builds
+
+
+def default_values():
+    # Every cached value a fresh session shows before touching a widget
+    index_args = (metrics.DEFAULT_INDEX_WEIGHTS, metrics.INDEX_NORMALIZATIONS[0], filters.NO_FILTER)
+    values = [(indicator_correlation, (indicator,) + index_args) for indicator in indicators]
+    values.append((index_extremes, ('state',) + index_args))
+    values += [(transaction_summary, (kind,)) for kind in TRANSACTION_KINDS]
+    return values
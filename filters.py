@@ -0,0 +1,93 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+from data_layer import get_source, source_version
+
+# A global selection; an empty tuple means "no restriction" on that dimension
+PlaceFilter = collections.namedtuple('PlaceFilter', ['regions', 'states', 'population_types'])
+NO_FILTER = PlaceFilter((), (), ())
+
+# Column each PlaceFilter field filters on, per level (None: not available)
+FILTER_COLUMNS = {
+    'state': PlaceFilter('Region', 'Estado', None),
+    'municipal': PlaceFilter('Region', 'Estado', 'Tipo_de_poblacion'),
+}
+
+
+def category_values(df, column):
+    return df.index if column == df.index.name else df[column]
+
+
+@cache_manager.cached('masks', versioned=True)
+def _category_masks(level, version):
+    # One boolean row per category value, aligned with the rows of the source
+    # frame; any filter combination is then an OR within and an AND across
+    # dimensions of these precomputed masks
+    df = get_source(level)
+    masks = {}
+    for column in FILTER_COLUMNS[level]:
+        if column is None:
+            continue
+        codes, uniques = pd.factorize(category_values(df, column))
+        matrix = codes[None, :] == np.arange(len(uniques))[:, None]
+        masks[column] = dict(zip(uniques, matrix))
+    return masks
+
+
+def category_masks(level):
+    return _category_masks(level, source_version(level))
+
+
+def filter_options(level, column):
+    return sorted(category_masks(level)[column].keys())
+
+
+def narrowed_options(level, column, place_filter):
+    # Values of column that still have rows under place_filter, e.g. the states
+    # of the selected regions
+    mask = filter_mask(level, place_filter)
+    return sorted(value for value, value_mask in category_masks(level)[column].items()
+                  if (value_mask & mask).any())
+
+
+def is_active(place_filter):
+    return any(place_filter)
+
+
+@cache_manager.cached('masks', versioned=True)
+def _filter_mask(level, place_filter, version):
+    masks = _category_masks(level, version)
+    mask = np.ones(len(get_source(level)), dtype=bool)
+    for column, selected in zip(FILTER_COLUMNS[level], place_filter):
+        if column is None or not selected:
+            continue
+        value_masks = [masks[column][value] for value in selected if value in masks[column]]
+        mask &= np.logical_or.reduce(value_masks) if value_masks else False
+    # Shared between sessions: callers must not modify it
+    mask.flags.writeable = False
+    return mask
+
+
+def filter_mask(level, place_filter):
+    return _filter_mask(level, place_filter, source_version(level))
+
+
+def filter_rows(level, place_filter):
+    # Source row positions kept by place_filter, or None when it keeps them all
+    if not is_active(place_filter):
+        return None
+    return np.flatnonzero(filter_mask(level, place_filter))
+
+
+def apply(level, df, place_filter):
+    # df must keep the row order of the level's source frame (e.g. state_indicators)
+    rows = filter_rows(level, place_filter)
+    return df if rows is None else df.take(rows)
+
+
+def matrix_mask(matrix, level, place_filter):
+    # Mask aligned with the rows of a metrics.IndicatorMatrix
+    return filter_mask(level, place_filter)[matrix.source_rows]
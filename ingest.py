@@ -0,0 +1,147 @@
+"""Bulk ingestion of CNBV releases into the columnar store.
+
+Discovers every historical (``Base_de_Datos_*``) and municipal consolidated
+CSV under a directory, then parses, cleans and writes them to the Parquet
+store of ``panel.py`` in parallel, one file per worker process. Progress is
+printed as files finish, with the parse and write time of each.
+
+The period of a release comes from its file name: ``2024Q2`` or ``202406``
+(the month of the cut-off, as in the CNBV file names).
+
+    python ingest.py backfill/
+    python ingest.py backfill/ --workers 8 --dry-run
+"""
+import argparse
+import collections
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import panel
+from data_layer import read_municipal, read_raw
+
+# Kind of release -> pattern of its file names
+KIND_PATTERNS = {
+    'historical': re.compile(r'Base_de_Datos', re.IGNORECASE),
+    'municipal': re.compile(r'Municipal', re.IGNORECASE),
+}
+
+QUARTER_PATTERN = re.compile(r'(?<!\d)(\d{4})[-_ ]?Q([1-4])(?!\d)', re.IGNORECASE)
+MONTH_PATTERN = re.compile(r'(?<!\d)(\d{4})(0[1-9]|1[0-2])(?!\d)')
+
+# kind -> (parser of the CSV, writer of the parsed frame into the store)
+INGESTERS = {
+    'historical': (read_raw, panel.add_historical_release),
+    'municipal': (read_municipal, panel.add_release),
+}
+
+Job = collections.namedtuple('Job', ['path', 'kind', 'period', 'size'])
+Result = collections.namedtuple('Result', ['job', 'rows', 'parse_seconds', 'write_seconds', 'error'])
+
+
+def file_kind(name):
+    for kind, pattern in KIND_PATTERNS.items():
+        if pattern.search(name):
+            return kind
+    return None
+
+
+def file_period(name):
+    match = QUARTER_PATTERN.search(name)
+    if match:
+        return f'{match[1]}Q{match[2]}'
+    match = MONTH_PATTERN.search(name)
+    if match:
+        return f'{match[1]}Q{(int(match[2]) - 1) // 3 + 1}'
+    return None
+
+
+def discover(directory):
+    # (jobs, skipped) for every CSV under directory; skipped holds (path, reason)
+    jobs = {}
+    skipped = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.lower().endswith('.csv'):
+                continue
+            path = os.path.join(root, name)
+            kind = file_kind(name)
+            period = file_period(name)
+            if kind is None:
+                skipped.append((path, 'not a historical or municipal release'))
+            elif period is None:
+                skipped.append((path, 'no period (2024Q2 or 202406) in the file name'))
+            elif (kind, period) in jobs:
+                skipped.append((path, f'same {kind} period as {jobs[(kind, period)].path}'))
+            else:
+                jobs[(kind, period)] = Job(path, kind, period, os.path.getsize(path))
+    # Largest files first, so the pool does not end waiting on one big file
+    return sorted(jobs.values(), key=lambda job: -job.size), skipped
+
+
+def ingest_file(job, output_dirs):
+    # Runs in a worker process: parse and write one release
+    parse, write = INGESTERS[job.kind]
+    try:
+        start = time.perf_counter()
+        df = parse(job.path)
+        parsed = time.perf_counter()
+        write(df, job.period, output_dirs[job.kind])
+        return Result(job, len(df), parsed - start, time.perf_counter() - parsed, None)
+    except Exception as e:  # reported with the file, the other files still go in
+        return Result(job, 0, 0.0, 0.0, f'{type(e).__name__}: {e}')
+
+
+def ingest(jobs, output_dirs, workers):
+    # Yields results as they complete
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(ingest_file, job, output_dirs) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory', help='directory searched recursively for release CSVs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='parallel processes')
+    parser.add_argument('--panel-dir', default=panel.PANEL_DIR, help='store of the municipal releases')
+    parser.add_argument('--historical-dir', default=panel.HISTORICAL_DIR, help='store of the historical releases')
+    parser.add_argument('--dry-run', action='store_true', help='only list what would be ingested')
+    options = parser.parse_args()
+
+    panel.require_pyarrow()
+    jobs, skipped = discover(options.directory)
+    for path, reason in skipped:
+        print(f'skipped {path}: {reason}')
+    print(f'{len(jobs)} releases to ingest with {options.workers} workers')
+    if options.dry_run:
+        for job in sorted(jobs, key=lambda job: (job.kind, job.period)):
+            print(f'  {job.kind:<10} {job.period}  {job.path}')
+        return
+    if not jobs:
+        return
+
+    output_dirs = {'historical': options.historical_dir, 'municipal': options.panel_dir}
+    start = time.perf_counter()
+    busy = 0.0
+    failures = 0
+    for done, result in enumerate(ingest(jobs, output_dirs, options.workers), 1):
+        job = result.job
+        if result.error:
+            failures += 1
+            print(f'[{done}/{len(jobs)}] {job.kind:<10} {job.period}  FAILED {result.error}  ({job.path})')
+            continue
+        busy += result.parse_seconds + result.write_seconds
+        print(f'[{done}/{len(jobs)}] {job.kind:<10} {job.period}  {result.rows:>6} rows  '
+              f'parse {result.parse_seconds:6.2f}s  write {result.write_seconds:6.2f}s  ({job.path})')
+    elapsed = time.perf_counter() - start
+    print(f'{len(jobs) - failures} releases in {elapsed:.1f}s ({busy:.1f}s of work, '
+          f'{busy / elapsed if elapsed else 0:.1f}x parallel), {failures} failed')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Bilingual (English / Spanish) labels of columns, categories and chart text.
+
+Every label is keyed by a canonical ID: the column name as spelled in the
+municipal file (state spellings resolve through STATE_INDICATOR_ALIASES),
+the Spanish name of a transaction category, or a short key for shared chart
+text. Lookups go through one dict per language built on first use, and
+``labels`` translates a whole column of IDs with a single ``map``.
+"""
+import functools
+
+import pandas as pd
+
+from data_layer import STATE_INDICATOR_ALIASES
+
+LANGUAGES = {'en': 'English', 'es': 'Español'}
+DEFAULT_LANGUAGE = 'en'
+
+# Indicator columns, per 10,000 adults
+COLUMN_LABELS = {
+    'Sucursales_banca_comercial_10mil_adultos': ('Commercial bank branches', 'Sucursales de banca comercial'),
+    'Sucursales_banca_desarrollo_10mil_adultos': ('Development bank branches', 'Sucursales de banca de desarrollo'),
+    'Sucursales_cooperativas_10mil_adultos': ('Cooperative branches', 'Sucursales de cooperativas'),
+    'Sucursales_microfinancieras_10mil_adultos': ('Microfinance branches', 'Sucursales de microfinancieras'),
+    'Total_sucursales_10mil_adultos': ('Total branches', 'Sucursales totales'),
+    'Corresponsales_10mil_adultos': ('Banking agents', 'Corresponsales'),
+    'Cajeros_10mil_adultos': ('ATMs', 'Cajeros automáticos'),
+    'TPV_10mil_adultos': ('POS', 'Terminales punto de venta'),
+    'Establecimientos_con_TPV_10mil_adultos': ('Places with POS', 'Establecimientos con TPV'),
+    'Contratos_celular_10mil_adultos': ('Mobile banking contracts', 'Contratos de banca móvil'),
+    'Cuentas_deposito_ahorro_10mil_adultos_EACP': ('Savings accounts (EACP)', 'Cuentas de ahorro (EACP)'),
+    'Cuentas_deposito_a_la_vista_10mil_adultos_EACP': ('Demand deposit accounts (EACP)',
+                                                       'Depósitos a la vista (EACP)'),
+    'Cuentas_deposito_a_plazo_10mil_adultos_EACP': ('Term deposit accounts (EACP)', 'Depósitos a plazo (EACP)'),
+    'Tarjeta_debito_10mil_adultos_EACP': ('Debit cards (EACP)', 'Tarjetas de débito (EACP)'),
+    'Cuentas_credito_al_consumo_10mil_adultos_EACP': ('Consumer credit (EACP)', 'Créditos al consumo (EACP)'),
+    'Cuentas_credito_a_la_vivienda_10mil_adultos_EACP': ('Housing credit (EACP)', 'Créditos a la vivienda (EACP)'),
+    'Cuentas_Nivel1_10mil_adultos_Banca': ('Level 1 accounts', 'Cuentas nivel 1'),
+    'Cuentas_Nivel2_10mil_adultos_Banca': ('Level 2 accounts', 'Cuentas nivel 2'),
+    'Cuentas_Nivel3_10mil_adultos_Banca': ('Level 3 accounts', 'Cuentas nivel 3'),
+    'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca': ('Traditional transactional accounts',
+                                                                  'Cuentas transaccionales tradicionales'),
+    'Cuentas_ahorro_10mil_adultos_Banca': ('Savings accounts', 'Cuentas de ahorro'),
+    'Cuentas_depositos_plazo_10mil_adultos_Banca': ('Term deposit accounts', 'Depósitos a plazo'),
+    'Tarjetas_debito_10mil_adultos_Banca': ('Debit cards', 'Tarjetas de débito'),
+    'Tarjetas_credito_10mil_adultos_Banca': ('Credit cards', 'Tarjetas de crédito'),
+    'Creditos_hipotecarios_10mil_adultos_Banca': ('Mortgage credits', 'Créditos hipotecarios'),
+    'Creditos_grupales_10mil_adultos_Banca': ('Group credits', 'Créditos grupales'),
+    'Creditos_personales_10mil_adultos_Banca': ('Personal credits', 'Créditos personales'),
+    'Creditos_nomina_10mil_adultos_Banca': ('Salary credits', 'Créditos de nómina'),
+    'Creditos_automotrices_10mil_adultos_Banca': ('Automotive credits', 'Créditos automotrices'),
+    'Creditos_ABCD_10mil_adultos_Banca': ('ABCD credits', 'Créditos ABCD'),
+    'Transacciones_en_TPV_10mil_adultos_Banca': ('POS transactions', 'Transacciones en TPV'),
+    'Transacciones_en_Cajeros_10mil_adultos_Banca': ('ATM transactions', 'Transacciones en cajeros'),
+    # Derived columns
+    'FI_Index': ('Financial Inclusion Index', 'Índice de Inclusión Financiera'),
+    'Poblacion': ('Population', 'Población'),
+}
+
+# Card transaction categories, keyed by their name in the Banxico files
+CATEGORY_LABELS = {
+    'Agencias de Viajes': 'Travel Agencies',
+    'Agregadores': 'Aggregators',
+    'Aseguradoras': 'Insurance',
+    'Beneficencia': 'Charity',
+    'Colegios y Universidades': 'Universities',
+    'Comida Rápida': 'Fast Food',
+    'Educación Básica': 'Basic Education',
+    'Entretenimiento': 'Entertainment',
+    'Estacionamientos': 'Parking',
+    'Farmacias': 'Pharmacies',
+    'Gasolineras': 'Gas Stations',
+    'Gobierno': 'Government',
+    'Grandes superficies': 'Department Stores',
+    'Guarderías': 'Daycare',
+    'Hospitales': 'Hospitals',
+    'Hoteles': 'Hotels',
+    'Misceláneos': 'Miscellaneous',
+    'Médicos y dentistas': 'Healthcare',
+    'No definido': 'Undefined',
+    'Otros': 'Others',
+    'Peaje': 'Toll',
+    'Refacciones y ferretería': 'Hardware Stores',
+    'Renta de Autos': 'Car Rental',
+    'Restaurantes': 'Restaurants',
+    'Salones de belleza': 'Beauty Salons',
+    'Supermercados': 'Supermarkets',
+    'Telecomunicaciones': 'Telecommunications',
+    'Transporte Aéreo': 'Air Transport',
+    'Transporte Terrestre de Pasajeros': 'Ground Transport',
+    'Ventas al detalle (Retail)': 'Retail'
+}
+
+# Shared chart text; {placeholders} are filled by the caller
+TEXT = {
+    'state': ('state', 'estado'),
+    'category': ('category', 'categoría'),
+    'percentage': ('percentage', 'porcentaje'),
+    'growth': ('growth (%)', 'crecimiento (%)'),
+    'per_10k': ('{label} per 10,000 adults', '{label} por cada 10,000 adultos'),
+    'number_per_10k': ('number per 10,000 adults', 'número por cada 10,000 adultos'),
+    'accounts_per_10k': ('accounts per 10,000 adults', 'cuentas por cada 10,000 adultos'),
+    'credits_per_10k': ('credits per 10,000 adults', 'créditos por cada 10,000 adultos'),
+    'branches_per_10k': ('branches per 10,000 adults', 'sucursales por cada 10,000 adultos'),
+    'account_title': ('Account ownership by type per 10,000 adults',
+                      'Tenencia de cuentas por tipo por cada 10,000 adultos'),
+    'account_share_title': ('Account ownership by type (percentage)', 'Tenencia de cuentas por tipo (porcentaje)'),
+    'credit_title': ('Credit product penetration per 10,000 adults',
+                     'Penetración de productos de crédito por cada 10,000 adultos'),
+    'total_branches_title': ('Total financial institution branches per 10,000 adults',
+                             'Sucursales de instituciones financieras por cada 10,000 adultos'),
+    'relationship_title': ('Relationship between {label} and Financial Inclusion Index; size = population',
+                           'Relación entre {label} y el Índice de Inclusión Financiera; tamaño = población'),
+    'pie_hover': ('%{label}<br>%{value:.1f}B MXN<br>%{customdata[0]:.1f}%<extra></extra>',
+                  '%{label}<br>%{value:.1f} mil millones MXN<br>%{customdata[0]:.1f}%<extra></extra>'),
+    'transactions_total_pie': ('Transaction distribution by category in 2024',
+                               'Distribución de las transacciones por categoría en 2024'),
+    'transactions_credit_pie': ('Credit card transaction distribution by category in 2024',
+                                'Distribución de las transacciones con tarjeta de crédito por categoría en 2024'),
+    'transactions_debit_pie': ('Debit card transaction distribution by category in 2024',
+                               'Distribución de las transacciones con tarjeta de débito por categoría en 2024'),
+    'transactions_total_growth': ("Year-over-year growth by category (2023 to 2024), excluding 'Undefined'",
+                                  "Crecimiento anual por categoría (2023 a 2024), sin 'No definido'"),
+    'transactions_credit_growth': ("Credit card year-over-year growth by category (2023 to 2024), "
+                                   "excluding 'Undefined'",
+                                   "Crecimiento anual con tarjeta de crédito por categoría (2023 a 2024), "
+                                   "sin 'No definido'"),
+    'transactions_debit_growth': ("Debit card year-over-year growth by category (2023 to 2024), "
+                                  "excluding 'Undefined'",
+                                  "Crecimiento anual con tarjeta de débito por categoría (2023 a 2024), "
+                                  "sin 'No definido'"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def catalogue(lang=DEFAULT_LANGUAGE):
+    # ID -> label for one language, including the state spellings of columns
+    i = list(LANGUAGES).index(lang)
+    labels = {col: names[i] for col, names in COLUMN_LABELS.items()}
+    labels.update((alias, labels[col]) for col, alias in STATE_INDICATOR_ALIASES.items())
+    labels.update((category, english if lang == 'en' else category) for category, english in CATEGORY_LABELS.items())
+    return labels
+
+
+def label(key, lang=DEFAULT_LANGUAGE):
+    return catalogue(lang).get(key, key)
+
+
+def labels(keys, lang=DEFAULT_LANGUAGE):
+    # Vectorized label(): one dict lookup pass over a Series or list of IDs
+    keys = pd.Series(keys)
+    return keys.map(catalogue(lang)).fillna(keys)
+
+
+def text(key, lang=DEFAULT_LANGUAGE, **values):
+    template = TEXT[key][list(LANGUAGES).index(lang)]
+    return template.format(**values) if values else template
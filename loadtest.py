@@ -0,0 +1,262 @@
+"""Concurrent-user load test for the dashboard.
+
+Starts one or more local replicas (through ``warmup.py``, as in production),
+then opens N simulated browser sessions over Streamlit's websocket protocol.
+Each session loads the page and keeps replaying widget changes a visitor
+makes: the infrastructure dropdown, the view-type radios and the historical
+dropdowns. Every change triggers a rerun; its latency is the time from
+sending the new widget state to the script-finished message.
+
+Reports p50/p95/p99 rerun latency per replica together with its CPU usage
+and resident memory, sampled from /proc (Linux only). Needs the websocket
+client from requirements-dev.txt.
+
+    python loadtest.py --sessions 20 --duration 60
+    python loadtest.py --sessions 50 --replicas 2 --think 0.5
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+WARMUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warmup.py')
+
+# Widgets a session plays with: (element type, user key, label, occurrence of
+# that label on the page); keyed widgets are matched by key, others by label
+WidgetRef = collections.namedtuple('WidgetRef', ['kind', 'key', 'label', 'occurrence'])
+
+SCENARIO = [
+    WidgetRef('selectbox', 'infrastructure', None, 0),
+    WidgetRef('radio', None, 'Select view type', 0),
+    WidgetRef('radio', None, 'Select view', 0),
+    WidgetRef('radio', 'credit_view', None, 0),
+    WidgetRef('radio', 'debit_view', None, 0),
+    WidgetRef('selectbox', None, 'Select type of infrastructure:', 0),
+    WidgetRef('selectbox', None, "Select a type of 'Captación' (or total):", 0),
+    WidgetRef('selectbox', None, "Select a type of 'Captación' (or total):", 1),
+    WidgetRef('selectbox', None, "Select a type of 'Crédito' (or total):", 0),
+    WidgetRef('selectbox', None, "Select a type of 'Crédito' (or total):", 1),
+]
+
+# Seconds between /proc samples of each replica
+SAMPLE_INTERVAL = 0.5
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def start_replica(port):
+    command = [sys.executable, WARMUP_PATH, '--server.port', str(port), '--server.headless', 'true',
+               '--server.fileWatcherType', 'none', '--browser.gatherUsageStats', 'false']
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'replica on port {port} exited with code {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'replica on port {port} did not become healthy in {timeout}s')
+
+
+def process_usage(pid):
+    # (CPU seconds, resident bytes) of a process, from /proc
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    with open(f'/proc/{pid}/statm') as f:
+        rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    return cpu, rss
+
+
+async def sample_usage(pid, samples, stop):
+    while not stop.is_set():
+        try:
+            samples.append((time.monotonic(),) + process_usage(pid))
+        except OSError:
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+class Session:
+    # One simulated browser tab
+    def __init__(self, port):
+        self.port = port
+        self.widgets = {}
+        self.states = {}
+        self.exceptions = []
+
+    async def connect(self):
+        self.socket = await websockets.connect(f'ws://127.0.0.1:{self.port}/_stcore/stream',
+                                               subprotocols=['streamlit'], max_size=None)
+
+    async def rerun(self):
+        # Sends the current widget states and waits for the script to finish
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self.socket.send(message.SerializeToString())
+
+        labels = collections.Counter()
+        widgets = {}
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.socket.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                element = forward.delta.new_element
+                element_type = element.WhichOneof('type')
+                if element_type == 'exception':
+                    # The app raised; the script still finishes "successfully"
+                    self.exceptions.append(element.exception.message)
+                elif element_type in ('selectbox', 'radio'):
+                    proto = getattr(element, element_type)
+                    widgets[(element_type, 'label', proto.label, labels[proto.label])] = proto
+                    widgets[(element_type, 'key', proto.id.rsplit('-', 1)[-1])] = proto
+                    labels[proto.label] += 1
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                self.widgets = widgets
+                return time.perf_counter() - start, forward.script_finished
+
+    def find(self, ref):
+        if ref.key is not None:
+            return self.widgets.get((ref.kind, 'key', ref.key))
+        return self.widgets.get((ref.kind, 'label', ref.label, ref.occurrence))
+
+    def change(self, ref, rng):
+        # Picks a different option of the widget, as a visitor clicking on it would
+        proto = self.find(ref)
+        if proto is None or len(proto.options) < 2:
+            return False
+        current = self.states.get(proto.id)
+        current = current.string_value if current is not None else proto.options[proto.default]
+        state = self.states.setdefault(proto.id, WidgetState(id=proto.id))
+        state.string_value = rng.choice([option for option in proto.options if option != current])
+        return True
+
+    async def close(self):
+        await self.socket.close()
+
+
+async def run_session(port, deadline, think, rng, results):
+    session = Session(port)
+    try:
+        await session.connect()
+        latency, status = await session.rerun()
+        results['initial'].append(latency)
+        while time.monotonic() < deadline:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+            if not session.change(rng.choice(SCENARIO), rng):
+                continue
+            latency, status = await session.rerun()
+            results['rerun'].append(latency)
+            if status != ForwardMsg.FINISHED_SUCCESSFULLY:
+                results['errors'].append(status)
+        results['errors'].extend(session.exceptions)
+        await session.close()
+    except (OSError, websockets.WebSocketException) as e:
+        results['errors'].append(repr(e))
+
+
+def percentiles(values):
+    if not values:
+        return 'n/a'
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return f'p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms'
+
+
+def print_report(ports, results, samples, elapsed):
+    print(f'{"":<14}{"sessions":>9}{"reruns":>8}{"errors":>8}{"reruns/s":>10}')
+    for port in ports:
+        r = results[port]
+        print(f'replica :{port:<6}{r["sessions"]:>9}{len(r["rerun"]):>8}{len(r["errors"]):>8}'
+              f'{len(r["rerun"]) / elapsed:>10.1f}')
+        print(f'  initial load  {percentiles(r["initial"])}')
+        print(f'  rerun         {percentiles(r["rerun"])}')
+        usage = samples[port]
+        if len(usage) >= 2:
+            (t0, cpu0, _), (t1, cpu1, _) = usage[0], usage[-1]
+            rss = [sample[2] for sample in usage]
+            print(f'  CPU {100 * (cpu1 - cpu0) / (t1 - t0):6.1f}%   RSS mean {np.mean(rss) / 2**20:7.1f} MB'
+                  f'   peak {max(rss) / 2**20:7.1f} MB')
+    if len(ports) > 1:
+        print(f'all replicas    rerun {percentiles([x for r in results.values() for x in r["rerun"]])}')
+
+
+async def load_test(ports, pids, sessions, duration, think, seed):
+    results = {port: {'sessions': 0, 'initial': [], 'rerun': [], 'errors': []} for port in ports}
+    samples = {port: [] for port in ports}
+    stop = asyncio.Event()
+    samplers = [asyncio.create_task(sample_usage(pid, samples[port], stop)) for port, pid in zip(ports, pids)]
+
+    start = time.monotonic()
+    deadline = start + duration
+    tasks = []
+    for i in range(sessions):
+        # Sessions are spread round-robin over the replicas, as a load balancer would
+        port = ports[i % len(ports)]
+        results[port]['sessions'] += 1
+        tasks.append(run_session(port, deadline, think, random.Random(seed + i), results[port]))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - start
+
+    stop.set()
+    await asyncio.gather(*samplers)
+    return results, samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of replay per session')
+    parser.add_argument('--think', type=float, default=1.0, help='mean pause between widget changes (s)')
+    parser.add_argument('--replicas', type=int, default=1, help='local app processes to start')
+    parser.add_argument('--port', type=int, default=8601, help='port of the first replica')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    options = parser.parse_args()
+
+    ports = [options.port + i for i in range(options.replicas)]
+    processes = [start_replica(port) for port in ports]
+    try:
+        for port, process in zip(ports, processes):
+            wait_until_healthy(port, process, options.startup_timeout)
+        print(f'{options.sessions} sessions on {options.replicas} replica(s) for {options.duration:.0f}s, '
+              f'{options.think:.1f}s mean think time')
+        results, samples, elapsed = asyncio.run(load_test(
+            ports, [process.pid for process in processes], options.sessions,
+            options.duration, options.think, options.seed))
+        print_report(ports, results, samples, elapsed)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
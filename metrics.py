@@ -0,0 +1,169 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+import labels
+from data_layer import (
+    INDICATOR_COLUMNS,
+    STATE_INDICATOR_ALIASES,
+    get_source,
+    source_version,
+)
+
+LEVEL_LABELS = {'state': 'States', 'municipal': 'Municipalities'}
+
+# Name of the place index at each level, as in the source files
+LEVEL_INDEX_NAMES = {'state': 'Estado', 'municipal': 'Municipio'}
+
+NORMALIZATIONS = ['z-score', 'min-max']
+
+# English labels of the indicators, for tables and widgets
+indicator_labels = {col: labels.label(col) for col in INDICATOR_COLUMNS}
+
+# raw and normalized are (entities x indicators) arrays sharing the row order of
+# labels; positions maps a label to its row so a selection is a plain gather, and
+# source_rows maps each row back to its row in the level's source frame
+IndicatorMatrix = collections.namedtuple(
+    'IndicatorMatrix', ['labels', 'columns', 'raw', 'normalized', 'positions', 'source_rows'])
+
+
+def level_rows(level):
+    # Rows of the source frame that are actual states or municipalities
+    df = get_source(level)
+    if level == 'state':
+        return df.index.notna()
+    return (df['Estado'] != 'Sin identificar').to_numpy()
+
+
+def level_indicators(level):
+    # One row per state or municipality, indicator columns in INDICATOR_COLUMNS order
+    if level == 'state':
+        df = get_source('state')[level_rows('state')]
+        values = df[[STATE_INDICATOR_ALIASES.get(col, col) for col in INDICATOR_COLUMNS]]
+        labels = df.index.astype(str)
+    else:
+        df = get_source('municipal')[level_rows('municipal')]
+        values = df[INDICATOR_COLUMNS]
+        labels = df['Municipio'] + ', ' + df['Estado']
+    values.columns = INDICATOR_COLUMNS
+    values.index = labels
+    return values
+
+
+def normalize(raw, normalization):
+    if normalization == 'z-score':
+        scale = raw.std(axis=0)
+        shift = raw.mean(axis=0)
+    else:
+        shift = raw.min(axis=0)
+        scale = raw.max(axis=0) - shift
+    # Constant indicators carry no information; map them to 0 instead of NaN
+    scale[scale == 0] = 1
+    return (raw - shift) / scale
+
+
+@cache_manager.cached('indices', versioned=True)
+def _indicator_matrix(level, normalization, version):
+    values = level_indicators(level)
+    raw = values.to_numpy(dtype=float)
+    # A handful of municipalities have gaps; impute the indicator's mean
+    missing = np.isnan(raw)
+    if missing.any():
+        raw = np.where(missing, np.nanmean(raw, axis=0), raw)
+    labels = values.index.to_numpy()
+    return IndicatorMatrix(
+        labels=labels,
+        columns=list(values.columns),
+        raw=raw,
+        normalized=normalize(raw, normalization),
+        positions={label: i for i, label in enumerate(labels)},
+        source_rows=np.flatnonzero(level_rows(level)),
+    )
+
+
+def indicator_matrix(level, normalization='z-score'):
+    # Computed once per (level, normalization) and source file version
+    return _indicator_matrix(level, normalization, source_version(level))
+
+
+def selection_rows(matrix, selected):
+    return np.array([matrix.positions[label] for label in selected], dtype=int)
+
+
+def comparison_table(matrix, rows):
+    # Raw values of every selection plus their difference against the first one
+    labels = matrix.labels[rows]
+    values = matrix.raw[rows]
+    table = pd.DataFrame(values.T, columns=labels,
+                         index=[indicator_labels[col] for col in matrix.columns])
+    base = values[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = (values[1:] - base) / np.abs(base) * 100
+    for label, delta, pct in zip(labels[1:], values[1:] - base, relative):
+        table[f'Δ {label} vs {labels[0]}'] = delta
+        table[f'Δ% {label} vs {labels[0]}'] = np.where(np.isfinite(pct), pct, np.nan)
+    return table.round(2)
+
+
+# Components of the financial inclusion index and the scaling the original fixed
+# formula applied to them (accounts and credits enter per 1,000)
+INDEX_COMPONENTS = {
+    'Commercial bank branches': ['Sucursales_banca_comercial_10mil_adultos'],
+    'ATMs': ['Cajeros_10mil_adultos'],
+    'Banking agents': ['Corresponsales_10mil_adultos'],
+    'Accounts': [
+        'Cuentas_Nivel1_10mil_adultos_Banca',
+        'Cuentas_Nivel2_10mil_adultos_Banca',
+        'Cuentas_Nivel3_10mil_adultos_Banca',
+        'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca'
+    ],
+    'Credits': [
+        'Creditos_hipotecarios_10mil_adultos_Banca',
+        'Creditos_personales_10mil_adultos_Banca',
+        'Creditos_nomina_10mil_adultos_Banca',
+        'Creditos_automotrices_10mil_adultos_Banca',
+        'Creditos_ABCD_10mil_adultos_Banca'
+    ],
+}
+ORIGINAL_SCALES = np.array([1, 1, 1, 1 / 1000, 1 / 1000])
+
+INDEX_NORMALIZATIONS = ['original', 'z-score', 'min-max']
+
+# Equal weights with the original scaling reproduce the fixed FI_Index formula
+DEFAULT_INDEX_WEIGHTS = (1.0, 1.0, 1.0, 1.0, 1.0)
+
+
+def aggregation_matrix():
+    # (indicators x components) 0/1 matrix, so summing into components is one product
+    aggregation = np.zeros((len(INDICATOR_COLUMNS), len(INDEX_COMPONENTS)))
+    for j, cols in enumerate(INDEX_COMPONENTS.values()):
+        for col in cols:
+            aggregation[INDICATOR_COLUMNS.index(col), j] = 1
+    return aggregation
+
+
+@cache_manager.cached('indices', versioned=True)
+def _component_matrix(level, normalization, version):
+    # The raw values do not depend on the matrix normalization
+    components = _indicator_matrix(level, 'z-score', version).raw @ aggregation_matrix()
+    if normalization == 'original':
+        return components * ORIGINAL_SCALES
+    return normalize(components, normalization)
+
+
+def component_matrix(level, normalization='original'):
+    # Places x index components, computed once per source file version
+    return _component_matrix(level, normalization, source_version(level))
+
+
+def inclusion_index(level, weights=DEFAULT_INDEX_WEIGHTS, normalization='original'):
+    # Weighted mean of the normalized components: one matrix-vector product
+    version = source_version(level)
+    components = _component_matrix(level, normalization, version)
+    weights = np.asarray(weights, dtype=float)
+    labels = _indicator_matrix(level, 'z-score', version).labels
+    return pd.Series(components @ weights / weights.sum(),
+                     index=pd.Index(labels, name=LEVEL_INDEX_NAMES[level]),
+                     name='FI_Index')
@@ -0,0 +1,327 @@
+"""Partitioned on-disk panel of quarterly municipal releases.
+
+Every release of the municipal consolidated file is written once as Parquet
+under ``PANEL_DIR``, partitioned Hive-style by period and state::
+
+    municipal_panel/period=2024Q2/Clave_Estado=14/2024Q2-0.parquet
+
+Queries never load the panel: they scan it batch by batch through a pyarrow
+dataset, reading only the requested columns (column pushdown) of the
+partitions that match the period and state predicates (partition pruning;
+other predicates are checked against Parquet row-group statistics). Rollups
+keep one partial aggregate per batch, rankings keep the best rows seen so
+far, so memory is bounded by the batch size and the size of the result.
+
+Per 10,000 adults rates are not summed: rollups add up the underlying counts
+and adult populations and divide at the end, as the CNBV computes them.
+
+Releases of the historical CNBV series (``Base_de_Datos_*``) are kept next to
+it under ``HISTORICAL_DIR``, one cleaned Parquet file per release, with every
+series already converted from its '1,234' text form to float.
+
+    python panel.py add Municipal-Level_Consolidated_Dataset.csv --period 2024Q2
+    python panel.py rollup Cajeros Cajeros_10mil_adultos --by period Clave_Estado
+    python panel.py rank Cajeros_10mil_adultos --period 2024Q2 --top 20
+    python panel.py series TPV_10mil_adultos --municipality 14039
+"""
+import argparse
+import functools
+import hashlib
+import operator
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # the panel is optional, the app itself only needs the CSVs
+    pa = None
+
+import cache_manager
+import shared_cache
+from data_layer import DATA_DIR, QUARTER_COL, YEAR_COL, read_municipal, read_raw, source_path, to_number
+from validation import RATE_COUNTS, RATE_POPULATIONS
+
+PANEL_DIR = os.environ.get('FIMX_PANEL_DIR', os.path.join(DATA_DIR, 'municipal_panel'))
+HISTORICAL_DIR = os.environ.get('FIMX_HISTORICAL_DIR', os.path.join(DATA_DIR, 'historical_panel'))
+
+# Quarter of the release shipped with the app (June 2024)
+CURRENT_PERIOD = '2024Q2'
+
+PERIOD_PATTERN = re.compile(r'^\d{4}Q[1-4]$')
+
+KEY_COLUMN = 'Clave_Municipio'
+LABEL_COLUMNS = ['Municipio', 'Estado']
+
+# Row numbers of the CSV export; not worth storing
+DROPPED_COLUMNS = ['Unnamed: 0']
+
+# Rows per scanned batch: bounds the memory of every query
+BATCH_ROWS = 1 << 16
+
+# Per 10,000 adults rate -> (count, adult population) it is computed from
+RATE_SOURCES = {
+    rate: (count, RATE_POPULATIONS['municipal'][dataset])
+    for dataset, rates in RATE_COUNTS.items()
+    for rate, count in rates.items()
+}
+
+
+def available():
+    return pa is not None
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('the municipal panel needs pyarrow (pip install pyarrow)')
+
+
+def check_period(period):
+    if not PERIOD_PATTERN.match(period):
+        raise ValueError(f"period must look like 2024Q2, got {period!r}")
+    return period
+
+
+def partitioning():
+    return ds.partitioning(pa.schema([('period', pa.string()), ('Clave_Estado', pa.int64())]), flavor='hive')
+
+
+def release_table(df, period):
+    # Numeric columns are stored as float64 so releases that parse a column as
+    # int in one quarter and float in another still share one schema
+    df = df.reset_index().drop(columns=DROPPED_COLUMNS, errors='ignore')
+    numeric = [col for col, dtype in df.dtypes.items()
+               if shared_cache.is_numeric(dtype) and col not in (KEY_COLUMN, 'Clave_Estado')]
+    df[numeric] = df[numeric].astype(float)
+    df['period'] = period
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def add_release(df, period, panel_dir=PANEL_DIR):
+    # Writes (or replaces) one period of the panel from a parsed municipal frame
+    require_pyarrow()
+    check_period(period)
+    shutil.rmtree(os.path.join(panel_dir, f'period={period}'), ignore_errors=True)
+    ds.write_dataset(release_table(df, period), panel_dir, format='parquet',
+                     partitioning=partitioning(), basename_template=f'{period}-{{i}}.parquet',
+                     existing_data_behavior='overwrite_or_ignore')
+
+
+def add_release_file(path, period, panel_dir=PANEL_DIR):
+    add_release(read_municipal(path), period, panel_dir)
+
+
+def historical_table(df, release):
+    # Period columns as numbers, every series column parsed once to float
+    data = {YEAR_COL: df[YEAR_COL].astype(int), QUARTER_COL: df[QUARTER_COL].astype(str)}
+    data.update((col, to_number(df[col]).astype(float)) for col in df.columns[3:])
+    table = pa.Table.from_pandas(pd.DataFrame(data), preserve_index=False)
+    return table.append_column('release', pa.array([release] * len(table), pa.string()))
+
+
+def add_historical_release(df, release, historical_dir=HISTORICAL_DIR):
+    # Writes (or replaces) one release of the historical series
+    require_pyarrow()
+    check_period(release)
+    directory = os.path.join(historical_dir, f'release={release}')
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    pq.write_table(historical_table(df, release), os.path.join(directory, f'{release}.parquet'))
+
+
+def add_historical_release_file(path, release, historical_dir=HISTORICAL_DIR):
+    add_historical_release(read_raw(path), release, historical_dir)
+
+
+def panel_version(panel_dir=PANEL_DIR):
+    # Hash of the file listing: changes whenever a release is added or replaced
+    digest = hashlib.sha256()
+    for root, _, files in sorted(os.walk(panel_dir)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(f'{os.path.relpath(os.path.join(root, name), panel_dir)}:{stat.st_size}:{stat.st_mtime_ns}'
+                          .encode())
+    return digest.hexdigest()[:16]
+
+
+@cache_manager.cached('datasets', versioned=True)
+def _dataset(panel_dir, version):
+    # Columns added or dropped between releases are unified; missing ones read as null
+    factory = ds.dataset(panel_dir, format='parquet', partitioning=partitioning())
+    schemas = [fragment.physical_schema for fragment in factory.get_fragments()]
+    if not schemas:
+        raise FileNotFoundError(f'no releases in the panel at {panel_dir}')
+    schema = pa.unify_schemas(schemas + [factory.partitioning.schema])
+    return ds.dataset(panel_dir, schema=schema, format='parquet', partitioning=partitioning())
+
+
+def dataset(panel_dir=PANEL_DIR):
+    require_pyarrow()
+    if not os.path.isdir(panel_dir):
+        raise FileNotFoundError(f'no panel at {panel_dir}; add releases with python panel.py add')
+    return _dataset(panel_dir, panel_version(panel_dir))
+
+
+def periods(panel_dir=PANEL_DIR):
+    if not os.path.isdir(panel_dir):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(panel_dir) if name.startswith('period='))
+
+
+def predicate(periods=None, states=None, municipalities=None):
+    # Period and state conditions prune whole partitions; municipality keys
+    # also imply their state (INEGI keys are state * 1000 + municipality)
+    conditions = []
+    if periods is not None:
+        conditions.append(ds.field('period').isin([check_period(p) for p in periods]))
+    if municipalities is not None:
+        municipalities = [int(m) for m in municipalities]
+        conditions.append(ds.field(KEY_COLUMN).isin(municipalities))
+        implied = {m // 1000 for m in municipalities}
+        states = implied if states is None else implied & {int(s) for s in states}
+    if states is not None:
+        conditions.append(ds.field('Clave_Estado').isin([int(s) for s in states]))
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+
+def release_version(period, panel_dir=PANEL_DIR):
+    return hashlib.sha256(f'{check_period(period)} {panel_version(panel_dir)}'.encode()).hexdigest()[:16]
+
+
+def release(period, panel_dir=PANEL_DIR):
+    # Every column of one period, indexed like read_municipal; columns only
+    # other releases have are left out
+    table = dataset(panel_dir).to_table(filter=predicate([period]))
+    if not table.num_rows:
+        raise KeyError(f'no {period} release in the panel at {panel_dir}')
+    return table.drop_columns(['period']).to_pandas().dropna(axis=1, how='all').set_index(KEY_COLUMN)
+
+
+def scan(columns, periods=None, states=None, municipalities=None, panel_dir=PANEL_DIR):
+    # Record batches of the requested columns only, from the matching partitions
+    scanner = dataset(panel_dir).scanner(columns=list(columns),
+                                         filter=predicate(periods, states, municipalities),
+                                         batch_size=BATCH_ROWS)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def summed_columns(columns):
+    # Columns to add up for the requested ones: rates become count + population
+    summed = []
+    for col in columns:
+        for source in RATE_SOURCES.get(col, (col,)):
+            if source not in summed:
+                summed.append(source)
+    return summed
+
+
+def grouped_sums(table, by, summed):
+    totals = table.group_by(by).aggregate([(col, 'sum') for col in summed])
+    return totals.select([f'{col}_sum' for col in summed] + by).rename_columns(summed + by)
+
+
+def rollup(columns, by=('period',), periods=None, states=None, panel_dir=PANEL_DIR):
+    # Totals of count columns and re-derived rates per group; each batch is
+    # folded into the running totals, which hold one row per group
+    by = list(by)
+    summed = summed_columns(columns)
+    totals = None
+    for batch in scan(by + summed, periods, states, panel_dir=panel_dir):
+        partial = grouped_sums(pa.Table.from_batches([batch]), by, summed)
+        totals = partial if totals is None else grouped_sums(pa.concat_tables([totals, partial]), by, summed)
+    if totals is None:
+        return pd.DataFrame(columns=list(columns), index=pd.MultiIndex.from_arrays([[]] * len(by), names=by))
+    totals = totals.to_pandas().set_index(by).sort_index()
+    result = pd.DataFrame(index=totals.index)
+    for col in columns:
+        if col in RATE_SOURCES:
+            count, population = RATE_SOURCES[col]
+            result[col] = totals[count] / totals[population] * 10000
+        else:
+            result[col] = totals[col]
+    return result
+
+
+def ranking(column, period, n=10, ascending=False, states=None, panel_dir=PANEL_DIR):
+    # Top (or bottom) n municipalities of one period; only the best n rows seen
+    # so far are kept between batches
+    columns = [KEY_COLUMN] + LABEL_COLUMNS + [column]
+    best = pd.DataFrame(columns=columns)
+    for batch in scan(columns, [period], states, panel_dir=panel_dir):
+        values = batch.column(column).to_numpy(zero_copy_only=False).astype(float)
+        order = values if ascending else -values
+        keep = np.argsort(np.where(np.isnan(order), np.inf, order), kind='stable')[:n]
+        candidates = batch.take(pa.array(keep)).to_pandas().dropna(subset=[column])
+        best = pd.concat([best, candidates], ignore_index=True) if len(best) else candidates
+        best = best.sort_values(column, ascending=ascending, kind='stable').head(n)
+    return best.set_index(KEY_COLUMN)
+
+
+def time_series(column, states=None, municipality=None, panel_dir=PANEL_DIR):
+    # One value per period: a municipality's own value, or the total (re-derived
+    # rate) of the given states or of the whole country
+    if municipality is None:
+        return rollup([column], ['period'], states=states, panel_dir=panel_dir)[column]
+    values = [batch.to_pandas() for batch in scan(['period', column], states=states,
+                                                  municipalities=[municipality], panel_dir=panel_dir)]
+    if not values:
+        return pd.Series(dtype=float, name=column, index=pd.Index([], name='period'))
+    return pd.concat(values).set_index('period')[column].sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--panel-dir', default=PANEL_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help='add or replace the release of one period')
+    add.add_argument('path', nargs='?', help='municipal consolidated CSV (default: the current one)')
+    add.add_argument('--period', default=CURRENT_PERIOD, type=check_period)
+
+    commands.add_parser('periods', help='list the periods in the panel')
+
+    roll = commands.add_parser('rollup', help='totals per group; rates are re-derived from counts')
+    roll.add_argument('columns', nargs='+')
+    roll.add_argument('--by', nargs='+', default=['period'], choices=['period', 'Clave_Estado', 'Region',
+                                                                     'Tipo_de_poblacion'])
+    roll.add_argument('--period', nargs='+', dest='periods')
+    roll.add_argument('--state', nargs='+', type=int, dest='states')
+
+    rank = commands.add_parser('rank', help='top municipalities of one period')
+    rank.add_argument('column')
+    rank.add_argument('--period', default=None, type=check_period, help='default: the latest one')
+    rank.add_argument('--top', type=int, default=10)
+    rank.add_argument('--ascending', action='store_true')
+    rank.add_argument('--state', nargs='+', type=int, dest='states')
+
+    series = commands.add_parser('series', help='one value per period')
+    series.add_argument('column')
+    series.add_argument('--state', nargs='+', type=int, dest='states')
+    series.add_argument('--municipality', type=int)
+    options = parser.parse_args()
+
+    pd.set_option('display.width', 160)
+    if options.command == 'add':
+        add_release_file(options.path or source_path('municipal'), options.period, options.panel_dir)
+        print(f'{options.period} written to {options.panel_dir}')
+    elif options.command == 'periods':
+        print('\n'.join(periods(options.panel_dir)) or 'The panel is empty')
+    elif options.command == 'rollup':
+        print(rollup(options.columns, options.by, options.periods, options.states, options.panel_dir).to_string())
+    elif options.command == 'rank':
+        period = options.period or periods(options.panel_dir)[-1]
+        print(ranking(options.column, period, options.top, options.ascending, options.states,
+                      options.panel_dir).to_string())
+    else:
+        print(time_series(options.column, options.states, options.municipality, options.panel_dir).to_string())
+
+
+if __name__ == '__main__':
+    main()
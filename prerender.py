@@ -0,0 +1,110 @@
+"""Pre-rendered default view of the app.
+
+Everything a new session shows before any widget is touched (the default
+figures as Plotly JSON, plus the values printed next to them such as the top
+and bottom 3 tables and the transaction totals) is rendered once per data and
+code version and stored in the shared cache directory. ``load`` hands those
+artifacts to the figure cache, which decodes each one the first time it is
+asked for; any other widget state misses them and is built live as before.
+
+Artifacts are keyed by the hash of every source file, of the modules that
+build the view and of the Plotly version, so new data or a code change
+renders them again on first use.
+
+    python prerender.py
+"""
+import functools
+import hashlib
+import os
+import pickle
+import threading
+
+import plotly
+import plotly.io as pio
+# Importing streamlit sets its Plotly template as the default, which the
+# figures must be built with to look as they do when built by the app
+import streamlit  # noqa: F401
+
+import figures
+import shared_cache
+from data_layer import SOURCE_FILES, source_version
+
+# Bump when the artifact layout changes
+PRERENDER_VERSION = 1
+
+# Modules whose code decides what the default view looks like
+CODE_MODULES = ['data_layer', 'figures', 'filters', 'labels', 'metrics', 'projections']
+
+_loaded_version = None
+_load_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    return hashlib.sha256(f'{plotly.__version__} {pio.templates.default} '
+                          f'{shared_cache.code_version(*CODE_MODULES)}'.encode()).hexdigest()
+
+
+def artifact_version():
+    digest = hashlib.sha256(code_version().encode())
+    for name in SOURCE_FILES:
+        digest.update(source_version(name).encode())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(version):
+    return os.path.join(shared_cache.CACHE_DIR, f'prerender-v{PRERENDER_VERSION}-{version}.pkl')
+
+
+def render():
+    # Builds (or takes from the cache) every default figure and value
+    rendered = {'figures': {}, 'values': {}}
+    for builder, args in figures.default_figures():
+        rendered['figures'][(builder.__name__,) + args] = pio.to_json(builder(*args), validate=False)
+    for fn, args in figures.default_values():
+        rendered['values'][(fn.__name__,) + args] = fn(*args)
+    return rendered
+
+
+def write(path, rendered):
+    if not shared_cache.enabled():
+        return
+    try:
+        # Artifacts of older data or code are no longer needed
+        shared_cache.publish_entry(path, f'prerender-v{PRERENDER_VERSION}-',
+                                   lambda staging: shared_cache.write_pickle(staging, rendered))
+    except OSError:
+        pass
+
+
+def read(path):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def load():
+    # Seeds the figure cache with the default view, rendering it if this host
+    # has no artifacts for the current version yet
+    global _loaded_version
+    with _load_lock:
+        version = artifact_version()
+        if version == _loaded_version:
+            return
+        path = artifact_path(version)
+        rendered = read(path) if shared_cache.enabled() else None
+        if rendered is None:
+            rendered = render()
+            write(path, rendered)
+        else:
+            figures.seed_prerendered(rendered['figures'], rendered['values'])
+        _loaded_version = version
+
+
+if __name__ == '__main__':
+    path = artifact_path(artifact_version())
+    rendered = render()
+    write(path, rendered)
+    print(f"{len(rendered['figures'])} figures and {len(rendered['values'])} values written to {path}")
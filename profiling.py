@@ -0,0 +1,135 @@
+"""Opt-in profiling of individual reruns of the app.
+
+With ``FIMX_PROFILE=1`` every rerun is profiled; with ``FIMX_PROFILE=query``
+only reruns of sessions opened with ``?profile=1`` are. For each profiled
+rerun four files are written to ``FIMX_PROFILE_DIR`` (default ``profiles``),
+named after the time of the rerun and a hash of its widget state:
+
+- ``.prof``: cProfile stats, for ``python -m pstats``, snakeviz, flameprof or
+  gprof2dot
+- ``.tracemalloc``: allocation snapshot at the end of the rerun, for
+  ``tracemalloc.Snapshot.load``
+- ``.allocations.txt``: the lines that allocated most during the rerun
+- ``.json``: the widget state that triggered the rerun, wall time, peak
+  traced memory and the exception that ended it, if any (``StopException``
+  for ``st.stop()``, ``RerunException`` when a newer rerun replaced it)
+
+app.py runs the page inside ``rerun()``, so reruns that raise or are cut short
+are written too. cProfile allows one active profiler per process (Python
+3.12+), so one rerun is profiled at a time and reruns that overlap it run
+unprofiled.
+"""
+import collections
+import contextlib
+import cProfile
+import hashlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import streamlit as st
+
+PROFILE_DIR = os.environ.get('FIMX_PROFILE_DIR', 'profiles')
+
+# Allocation sites listed in the text report
+TOP_ALLOCATIONS = 25
+
+# Frames kept per traced allocation
+TRACEMALLOC_FRAMES = 10
+
+RerunProfile = collections.namedtuple(
+    'RerunProfile', ['profiler', 'snapshot', 'widget_state', 'started', 'start_time', 'started_tracing'])
+
+# Held by the rerun being profiled
+_profile_lock = threading.Lock()
+
+
+def enabled():
+    mode = os.environ.get('FIMX_PROFILE', '0')
+    if mode == 'query':
+        return st.query_params.get('profile') == '1'
+    return mode == '1'
+
+
+def widget_state():
+    # Everything JSON can't hold (uploaded files, frames) is kept as its repr
+    return json.loads(json.dumps(
+        {str(key): value for key, value in st.session_state.to_dict().items()}, default=repr, sort_keys=True))
+
+
+def start():
+    # Returns the profile of this rerun, or None when it isn't profiled
+    if not enabled() or not _profile_lock.acquire(blocking=False):
+        return None
+    started_tracing = not tracemalloc.is_tracing()
+    try:
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        profile = RerunProfile(cProfile.Profile(), tracemalloc.take_snapshot(), widget_state(), time.time(),
+                               time.perf_counter(), started_tracing)
+        profile.profiler.enable()
+    except BaseException as e:
+        _release(started_tracing)
+        if not isinstance(e, ValueError):
+            raise
+        # Another profiling tool is active in this process: run unprofiled
+        return None
+    return profile
+
+
+def _release(started_tracing):
+    if started_tracing:
+        tracemalloc.stop()
+    _profile_lock.release()
+
+
+def finish(profile, ended_by=None):
+    # ended_by is the exception class that ended the rerun, if any
+    if profile is None:
+        return
+    profile.profiler.disable()
+    elapsed = time.perf_counter() - profile.start_time
+    try:
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        _release(profile.started_tracing)
+
+    state_hash = hashlib.sha256(json.dumps(profile.widget_state, sort_keys=True).encode()).hexdigest()[:8]
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(profile.started))
+    base = os.path.join(PROFILE_DIR, f'{stamp}-{int(profile.started * 1000) % 1000:03d}-{state_hash}')
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    profile.profiler.dump_stats(f'{base}.prof')
+    snapshot.dump(f'{base}.tracemalloc')
+    top = snapshot.compare_to(profile.snapshot, 'lineno')[:TOP_ALLOCATIONS]
+    with open(f'{base}.allocations.txt', 'w') as f:
+        f.write(f'Top {len(top)} allocation sites during the rerun (size and count are net of the start)\n')
+        for stat in top:
+            f.write(f'{stat}\n')
+    with open(f'{base}.json', 'w') as f:
+        json.dump({
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(profile.started)),
+            'seconds': round(elapsed, 4),
+            'peak_traced_bytes': peak,
+            'ended_by': ended_by.__name__ if ended_by else None,
+            'widget_state': profile.widget_state,
+        }, f, indent=2, ensure_ascii=False)
+
+
+@contextlib.contextmanager
+def rerun():
+    # Profiles the block when this rerun is profiled
+    profile = None
+    ended_by = None
+    try:
+        profile = start()
+        yield
+    except BaseException as e:
+        ended_by = type(e)
+        raise
+    finally:
+        finish(profile, ended_by)
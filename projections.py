@@ -0,0 +1,135 @@
+"""Trend projections for the card and historical CNBV series.
+
+All series of a source are stacked into one (series x periods) matrix and
+fitted together: the least-squares normal equations of every series are
+built with one einsum, using a 0/1 weight per observation so gaps and the
+fit window need no per-series code, and solved as a batch of 2x2 systems.
+Projections come with prediction intervals from each series' residual
+variance. Fits are cached per source file version, model and window.
+"""
+import collections
+
+import numpy as np
+
+import cache_manager
+from data_layer import QUARTER_COL, YEAR_COL, get_source, source_version, to_number
+
+MODELS = ['linear', 'exponential']
+
+# Defaults: fit the last FIT_YEARS years, project HORIZON years ahead
+FIT_YEARS = 8
+HORIZON = 3
+
+# Two-sided level of the prediction intervals
+INTERVAL_Z = 1.959964
+
+# names label the rows of values; times are fractional years (2024.25 = 2T 2024)
+SeriesMatrix = collections.namedtuple('SeriesMatrix', ['names', 'times', 'values'])
+
+# coef holds (level at t_ref, slope) per series; for the exponential model
+# both are on the log scale
+Trend = collections.namedtuple('Trend', ['model', 't_ref', 'coef', 'inverse', 'sigma2', 'dof'])
+
+Projection = collections.namedtuple('Projection', ['names', 'times', 'mean', 'lower', 'upper'])
+
+
+def card_series():
+    df = get_source('card_brands')
+    return SeriesMatrix(
+        names=list(df['Título']),
+        times=df.columns[1:].astype(float).to_numpy(),
+        values=df.iloc[:, 1:].to_numpy(dtype=float),
+    )
+
+
+def historical_series():
+    df = get_source('historical')
+    # Quarter k of a year sits at year + (k - 1) / 4, so 4T is year + 0.75
+    quarters = df[QUARTER_COL].str[0].astype(int)
+    columns = df.columns[3:]
+    return SeriesMatrix(
+        names=list(columns),
+        times=(df[YEAR_COL] + (quarters - 1) / 4).to_numpy(dtype=float),
+        values=np.stack([to_number(df[col]).to_numpy() for col in columns]),
+    )
+
+
+SERIES_BUILDERS = {'card_brands': card_series, 'historical': historical_series}
+
+
+def t_quantile(dof):
+    # Student t quantile for INTERVAL_Z by a Cornish-Fisher expansion of the
+    # normal one; within 1% of the exact value from 3 degrees of freedom up
+    z = INTERVAL_Z
+    dof = np.maximum(dof, 1)
+    return (z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * dof ** 3))
+
+
+def fit_trends(times, values, model='linear', window=FIT_YEARS):
+    # Least-squares trend of every row of values at once; missing values and
+    # periods older than the window (the last `window` years, so 8 annual or
+    # 32 quarterly points for 8) get zero weight
+    y = values
+    if model == 'exponential':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y = np.log(np.where(values > 0, values, np.nan))
+    t_ref = times.max()
+    weights = (np.isfinite(y) & (times > t_ref - window)).astype(float)
+    y = np.where(weights > 0, y, 0.0)
+
+    design = np.stack([np.ones_like(times), times - t_ref], axis=1)
+    normal = np.einsum('sp,pi,pj->sij', weights, design, design)
+    rhs = np.einsum('sp,pi,sp->si', weights, design, y)
+
+    # Series with fewer than 3 points cannot be fitted with an error estimate
+    n_points = weights.sum(axis=1)
+    fitted = n_points >= 3
+    normal[~fitted] = np.eye(2)
+    inverse = np.linalg.inv(normal)
+    coef = np.einsum('sij,sj->si', inverse, rhs)
+    residuals = (y - coef @ design.T) * weights
+    dof = n_points - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sigma2 = np.where(fitted, (residuals ** 2).sum(axis=1) / dof, np.nan)
+    coef[~fitted] = np.nan
+    return Trend(model, t_ref, coef, inverse, sigma2, dof)
+
+
+def project(trend, times):
+    # Mean and prediction interval of every series at the given times
+    design = np.stack([np.ones_like(times), times - trend.t_ref], axis=1)
+    mean = trend.coef @ design.T
+    leverage = np.einsum('hi,sij,hj->sh', design, trend.inverse, design)
+    spread = t_quantile(trend.dof)[:, None] * np.sqrt(trend.sigma2[:, None] * (1 + leverage))
+    lower, upper = mean - spread, mean + spread
+    if trend.model == 'exponential':
+        return np.exp(mean), np.exp(lower), np.exp(upper)
+    return mean, lower, upper
+
+
+def projection_times(source, series, horizon):
+    # Year ends after the last period: same position in the year as the
+    # annual card counts, 4T for the quarterly historical series
+    offset = 0.0 if source == 'card_brands' else 0.75
+    last_year = int(np.floor(series.times.max()))
+    return np.arange(last_year + 1, last_year + 1 + horizon) + offset
+
+
+@cache_manager.cached('projections', versioned=True)
+def _projections(source, model, window, horizon, version):
+    series = SERIES_BUILDERS[source]()
+    times = projection_times(source, series, horizon)
+    mean, lower, upper = project(fit_trends(series.times, series.values, model, window), times)
+    return Projection(series.names, times, mean, lower, upper)
+
+
+def projections(source, model='linear', window=FIT_YEARS, horizon=HORIZON):
+    return _projections(source, model, window, horizon, source_version(source))
+
+
+def series_projection(source, name, model='linear', window=FIT_YEARS, horizon=HORIZON):
+    # (years, mean, lower, upper) of one series, years as plotted on the charts
+    result = projections(source, model, window, horizon)
+    row = result.names.index(name)
+    return np.floor(result.times).astype(int), result.mean[row], result.lower[row], result.upper[row]
@@ -0,0 +1,138 @@
+"""Monte Carlo robustness of the financial inclusion ranking.
+
+Samples many weight vectors for the index components from a Dirichlet
+distribution centred on the user's weights, scores every place for a whole
+batch of weights with one matrix product and accumulates, per place, how
+often it lands on each rank. Large runs are split into chunks scored in a
+process pool; every batch draws from a stream derived from the seed and its
+index, so results are the same however the batches are split, and they are
+cached per configuration.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+import filters
+import metrics
+from data_layer import source_version
+
+SAMPLE_SIZES = [10000, 20000, 50000]
+
+# Weight vectors scored per matrix product
+BATCH_SIZE = 1000
+
+# Rank histograms keep at most this many bins per place; above that, ranks
+# are grouped so memory stays O(places) instead of O(places^2)
+MAX_RANK_BINS = 256
+
+# Runs with fewer (places x samples) scores than this stay in-process, where
+# they finish faster than a process pool can start
+PARALLEL_THRESHOLD = 20_000_000
+
+# Workers are never forked from the server: forking a process with live
+# threads (Streamlit's) can copy held locks and deadlock the child
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def sample_weights(rng, base_weights, concentration, n_samples):
+    # Dirichlet draws average to the normalized base weights; a higher
+    # concentration keeps them closer to it (1 with equal weights = uniform)
+    base = np.asarray(base_weights, dtype=float)
+    alpha = np.maximum(concentration * len(base) * base / base.sum(), 1e-3)
+    return rng.dirichlet(alpha, size=n_samples)
+
+
+def batch_rng(seed, batch):
+    # Each batch of samples draws from its own stream, derived from the seed
+    # and the batch index only, so results don't depend on how batches are
+    # split between workers
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch,)))
+
+
+def score_chunk(components, base_weights, concentration, n_samples, batches, seed, bin_width):
+    # Returns (rank histogram, rank sums, top-3 counts, bottom-3 counts) per
+    # place over the given batches of the n_samples weight vectors
+    n_places = len(components)
+    n_bins = -(-n_places // bin_width)
+    histogram = np.zeros(n_places * n_bins, dtype=np.int64)
+    rank_sums = np.zeros(n_places)
+    top_3 = np.zeros(n_places, dtype=np.int64)
+    bottom_3 = np.zeros(n_places, dtype=np.int64)
+    offsets = np.arange(n_places)[:, None] * n_bins
+
+    for batch in batches:
+        size = min(BATCH_SIZE, n_samples - batch * BATCH_SIZE)
+        weights = sample_weights(batch_rng(seed, batch), base_weights, concentration, size)
+        scores = components @ weights.T
+        # Rank 0 is the highest score in each column
+        order = np.argsort(-scores, axis=0, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(n_places)[:, None], axis=0)
+
+        histogram += np.bincount((offsets + ranks // bin_width).ravel(), minlength=len(histogram))
+        rank_sums += ranks.sum(axis=1)
+        top_3 += (ranks < 3).sum(axis=1)
+        bottom_3 += (ranks >= n_places - 3).sum(axis=1)
+
+    return histogram.reshape(n_places, n_bins), rank_sums, top_3, bottom_3
+
+
+def run_chunks(components, base_weights, concentration, n_samples, seed, bin_width):
+    n_batches = -(-n_samples // BATCH_SIZE)
+    n_chunks = max(1, min(os.cpu_count() or 1, n_batches))
+    if len(components) * n_samples < PARALLEL_THRESHOLD:
+        n_chunks = 1
+    chunks = [range(batches[0], batches[-1] + 1) for batches in np.array_split(np.arange(n_batches), n_chunks)]
+    args = [(components, base_weights, concentration, n_samples, batches, seed, bin_width) for batches in chunks]
+
+    if n_chunks == 1:
+        results = [score_chunk(*args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+            results = list(pool.map(score_chunk, *zip(*args)))
+    return [sum(parts) for parts in zip(*results)]
+
+
+def histogram_percentile(histogram, q, bin_width, edge):
+    # Rank bin reached by the q-th fraction of samples, reported as a 1-based rank
+    cumulative = np.cumsum(histogram, axis=1)
+    bins = (cumulative >= q * cumulative[:, -1:]).argmax(axis=1)
+    return bins * bin_width + 1 + edge * (bin_width - 1)
+
+
+@cache_manager.cached('indices', versioned=True)
+def _ranking_stability(level, normalization, base_weights, concentration, n_samples, seed, place_filter, version):
+    components = metrics.component_matrix(level, normalization)
+    current = metrics.inclusion_index(level, base_weights, normalization)
+    if filters.is_active(place_filter):
+        # Ranks among the filtered places only
+        mask = filters.matrix_mask(metrics.indicator_matrix(level), level, place_filter)
+        components = components[mask]
+        current = current[mask]
+    n_places = len(components)
+    bin_width = -(-n_places // MAX_RANK_BINS)
+
+    histogram, rank_sums, top_3, bottom_3 = run_chunks(
+        components, base_weights, concentration, n_samples, seed, bin_width)
+
+    result = pd.DataFrame({
+        'current rank': current.rank(ascending=False, method='first').astype(int).to_numpy(),
+        'mean rank': rank_sums / n_samples + 1,
+        # With grouped ranks the band uses the outer edges of its bins
+        'p5 rank': histogram_percentile(histogram, 0.05, bin_width, 0),
+        'median rank': histogram_percentile(histogram, 0.5, bin_width, 0.5),
+        'p95 rank': histogram_percentile(histogram, 0.95, bin_width, 1),
+        'P(top 3)': top_3 / n_samples,
+        'P(bottom 3)': bottom_3 / n_samples,
+    }, index=current.index)
+    return result.sort_values(['median rank', 'mean rank'])
+
+
+def ranking_stability(level, base_weights=metrics.DEFAULT_INDEX_WEIGHTS, normalization='original',
+                      concentration=1.0, n_samples=SAMPLE_SIZES[0], seed=0, place_filter=filters.NO_FILTER):
+    return _ranking_stability(level, normalization, tuple(base_weights), float(concentration),
+                              n_samples, seed, place_filter, source_version(level))
@@ -0,0 +1,181 @@
+"""Host-wide, read-only frame cache shared by every app process.
+
+Each cached frame is stored once per host as a directory of ``.npy`` files
+(one 2-D array per numeric dtype, one row per column) plus a small pickle
+holding the index and the non-numeric columns. Workers memory-map the arrays
+read-only, so all replicas on a host share the same physical pages instead of
+each holding a private parsed copy.
+
+Entries are keyed by a version string (the source file hash), so a changed
+source simply produces a new directory; stale versions are removed when the
+new one is published.
+
+The cache holds pickles, so it is only used when its directory belongs to the
+current user and nobody else can write to it; otherwise every process falls
+back to private copies.
+"""
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# One directory per user, so another account can't claim the default name
+CACHE_DIR = os.environ.get(
+    'FIMX_SHARED_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), f'financial-inclusion-mx-cache-{os.getuid()}'
+                 if hasattr(os, 'getuid') else 'financial-inclusion-mx-cache')
+)
+
+# Bump when the on-disk layout changes
+LAYOUT_VERSION = 1
+
+
+@functools.lru_cache(maxsize=None)
+def secure_cache_dir():
+    # Creates CACHE_DIR private to this user; False if it exists with another
+    # owner or is writable by others, since its pickles are loaded
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        stat = os.stat(CACHE_DIR)
+    except OSError:
+        return False
+    if hasattr(os, 'getuid') and (stat.st_uid != os.getuid() or stat.st_mode & 0o022):
+        warnings.warn(f'{CACHE_DIR} is not owned by this user or is writable by others; '
+                      'the shared cache is disabled')
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def code_version(*modules):
+    # Hash of the source of the given modules of the app, for keys of entries
+    # whose content depends on that code and not only on the data
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        with open(os.path.join(directory, f'{module}.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def enabled():
+    return os.environ.get('FIMX_SHARED_CACHE', '1') != '0' and secure_cache_dir()
+
+
+def is_numeric(dtype):
+    # Plain numpy numeric columns; extension dtypes (nullable ints, strings) are not
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biuf'
+
+
+def entry_dir(name, version):
+    return os.path.join(CACHE_DIR, f'{name}-v{LAYOUT_VERSION}-{version}')
+
+
+def write_frame(directory, df):
+    numeric = {}
+    other = []
+    for col, dtype in df.dtypes.items():
+        if is_numeric(dtype):
+            numeric.setdefault(dtype.str, []).append(col)
+        else:
+            other.append(col)
+
+    blocks = []
+    for i, (dtype, cols) in enumerate(numeric.items()):
+        filename = f'block{i}.npy'
+        # Column-major so that every column is one contiguous row of the file
+        values = np.ascontiguousarray(df[cols].to_numpy(dtype=dtype).T)
+        np.save(os.path.join(directory, filename), values)
+        blocks.append((filename, cols))
+
+    meta = {'columns': list(df.columns), 'blocks': blocks, 'other': df[other]}
+    with open(os.path.join(directory, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_frame(directory):
+    with open(os.path.join(directory, 'meta.pkl'), 'rb') as f:
+        meta = pickle.load(f)
+
+    other = meta['other']
+    data = {col: other[col] for col in other.columns}
+    for filename, cols in meta['blocks']:
+        # A plain ndarray view keeps the mapping alive without the memmap subclass
+        values = np.load(os.path.join(directory, filename), mmap_mode='r').view(np.ndarray)
+        for i, col in enumerate(cols):
+            data[col] = values[i]
+
+    # copy=False keeps one block per column, each a view into the mapped file
+    return pd.DataFrame({col: data[col] for col in meta['columns']},
+                        index=other.index, copy=False)
+
+
+def remove_entry(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def publish_entry(path, prefix, write):
+    # Writes the file or directory path of CACHE_DIR through write(staging_path)
+    # and an atomic rename, then removes the other entries starting with prefix
+    # (older versions of it)
+    staging = f'{path}.tmp-{os.getpid()}-{uuid.uuid4().hex}'
+    try:
+        write(staging)
+        # Atomic on POSIX; if another process got there first keep its copy
+        os.rename(staging, path)
+    except OSError:
+        remove_entry(staging)
+        if not os.path.exists(path):
+            raise
+        return
+    except BaseException:
+        remove_entry(staging)
+        raise
+
+    for entry in os.listdir(CACHE_DIR):
+        other = os.path.join(CACHE_DIR, entry)
+        if entry.startswith(prefix) and '.tmp-' not in entry and other != path:
+            # Processes still mapping the old files keep them until they exit
+            remove_entry(other)
+
+
+def write_pickle(path, value):
+    with open(path, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def publish(name, version, df):
+    def write(staging):
+        os.makedirs(staging)
+        write_frame(staging, df)
+
+    publish_entry(entry_dir(name, version), f'{name}-v', write)
+
+
+def attach(name, version, build):
+    # Return the shared copy of a frame, building and publishing it on first use
+    if not enabled():
+        return build()
+    directory = entry_dir(name, version)
+    df = None
+    try:
+        if not os.path.exists(os.path.join(directory, 'meta.pkl')):
+            df = build()
+            publish(name, version, df)
+        return read_frame(directory)
+    except OSError:
+        # Read-only or full filesystem: fall back to a private copy
+        return df if df is not None else build()
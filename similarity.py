@@ -0,0 +1,129 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+import filters
+import metrics
+from data_layer import source_version
+
+INFRASTRUCTURE_FEATURES = [
+    'Sucursales_banca_comercial_10mil_adultos',
+    'Total_sucursales_10mil_adultos',
+    'Corresponsales_10mil_adultos',
+    'Cajeros_10mil_adultos',
+    'TPV_10mil_adultos',
+    'Establecimientos_con_TPV_10mil_adultos'
+]
+
+ACCOUNT_FEATURES = [
+    'Cuentas_Nivel1_10mil_adultos_Banca',
+    'Cuentas_Nivel2_10mil_adultos_Banca',
+    'Cuentas_Nivel3_10mil_adultos_Banca',
+    'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca',
+    'Cuentas_ahorro_10mil_adultos_Banca',
+    'Tarjetas_debito_10mil_adultos_Banca',
+    'Contratos_celular_10mil_adultos'
+]
+
+CREDIT_FEATURES = [
+    'Tarjetas_credito_10mil_adultos_Banca',
+    'Creditos_hipotecarios_10mil_adultos_Banca',
+    'Creditos_grupales_10mil_adultos_Banca',
+    'Creditos_personales_10mil_adultos_Banca',
+    'Creditos_nomina_10mil_adultos_Banca',
+    'Creditos_automotrices_10mil_adultos_Banca',
+    'Creditos_ABCD_10mil_adultos_Banca'
+]
+
+FEATURE_SETS = {
+    'Infrastructure and account penetration': INFRASTRUCTURE_FEATURES + ACCOUNT_FEATURES,
+    'Infrastructure': INFRASTRUCTURE_FEATURES,
+    'Account penetration': ACCOUNT_FEATURES,
+    'Credit': CREDIT_FEATURES,
+    'All indicators': list(metrics.indicator_labels.keys()),
+}
+
+DISTANCE_METRICS = ['euclidean', 'manhattan', 'cosine']
+
+# Rows scored per step; bounds the temporary arrays to a few MB at any size
+BLOCK_ROWS = 16384
+
+# vectors is the contiguous (places x features) array; aux holds what each
+# metric precomputes (squared norms for euclidean, unit rows for cosine)
+SimilarityIndex = collections.namedtuple('SimilarityIndex', ['labels', 'vectors', 'metric', 'aux'])
+
+
+def build_index(vectors, labels, metric='euclidean'):
+    vectors = np.ascontiguousarray(vectors, dtype=float)
+    if metric == 'euclidean':
+        aux = np.einsum('ij,ij->i', vectors, vectors)
+    elif metric == 'cosine':
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        aux = vectors / norms
+    elif metric == 'manhattan':
+        aux = None
+    else:
+        raise ValueError(f'Unknown distance metric: {metric}')
+    return SimilarityIndex(np.asarray(labels), vectors, metric, aux)
+
+
+def block_distances(index, query, start, stop):
+    block = index.vectors[start:stop]
+    if index.metric == 'euclidean':
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2, one matrix-vector product per block
+        squared = index.aux[start:stop] - 2 * block @ query + query @ query
+        return np.sqrt(np.maximum(squared, 0))
+    if index.metric == 'cosine':
+        norm = np.linalg.norm(query)
+        return 1 - index.aux[start:stop] @ (query / norm if norm else query)
+    return np.abs(block - query).sum(axis=1)
+
+
+def query_index(index, query, k=10, exclude=None, candidates=None):
+    # Returns (rows, distances) of the k nearest rows, closest first; candidates
+    # is an optional boolean mask of the rows allowed in the result
+    query = np.asarray(query, dtype=float)
+    n_rows = len(index.vectors)
+    distances = np.empty(n_rows)
+    for start in range(0, n_rows, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n_rows)
+        distances[start:stop] = block_distances(index, query, start, stop)
+    if candidates is not None:
+        distances[~candidates] = np.inf
+    if exclude is not None:
+        distances[exclude] = np.inf
+
+    k = min(k, int(np.isfinite(distances).sum()))
+    nearest = np.argpartition(distances, k - 1)[:k] if k < n_rows else np.arange(n_rows)
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+    return nearest, distances[nearest]
+
+
+@cache_manager.cached('indices', versioned=True)
+def _similarity_index(level, features, metric, version):
+    matrix = metrics.indicator_matrix(level, 'z-score')
+    columns = [matrix.columns.index(col) for col in features]
+    return build_index(matrix.normalized[:, columns], matrix.labels, metric)
+
+
+def similarity_index(level, features, metric='euclidean'):
+    # One index per level, feature subset, metric and source file version
+    return _similarity_index(level, tuple(features), metric, source_version(level))
+
+
+def similar_places(level, place, features, metric='euclidean', k=10, place_filter=filters.NO_FILTER):
+    index = similarity_index(level, features, metric)
+    matrix = metrics.indicator_matrix(level, 'z-score')
+    row = matrix.positions[place]
+    candidates = filters.matrix_mask(matrix, level, place_filter) if filters.is_active(place_filter) else None
+    rows, distances = query_index(index, index.vectors[row], k=k, exclude=row, candidates=candidates)
+
+    columns = [matrix.columns.index(col) for col in features]
+    table = pd.DataFrame(matrix.raw[np.append(row, rows)][:, columns],
+                         columns=[metrics.indicator_labels[col] for col in features])
+    table.insert(0, 'distance', np.append(0.0, distances))
+    table.index = pd.Index(np.append(place, index.labels[rows]), name='place')
+    return table.round(3)
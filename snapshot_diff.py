@@ -0,0 +1,269 @@
+"""Differences between two releases of the state or municipal dataset.
+
+A snapshot is a parsed consolidated file plus the hash of its contents. Two
+snapshots are aligned on their INEGI keys (``Clave_Estado`` for states,
+``Clave_Municipio`` for municipalities) with one index join, after which the
+shared numeric columns are stacked into (places x columns) matrices and every
+absolute and relative change is a single array operation. Places present in
+only one release keep NaN on the other side.
+
+Diffs are cached per (level, old version, new version), so comparing the
+current data against an uploaded release, or a municipal release stored in
+the panel of panel.py, is computed once per pair.
+
+    python snapshot_diff.py old/Municipal-Level_Consolidated_Dataset.csv
+    python snapshot_diff.py --level state old.csv new.csv
+"""
+import argparse
+import collections
+import hashlib
+import io
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+import labels
+import metrics
+import shared_cache
+from data_layer import (
+    SOURCE_READERS,
+    get_source,
+    municipal_release,
+    municipal_release_version,
+    source_path,
+    source_version,
+)
+
+LEVELS = ['state', 'municipal']
+
+# Infrastructure counts whose appearance or disappearance in a place is reported
+INFRASTRUCTURE_COUNT_COLUMNS = [
+    'Sucursales_banca_comercial',
+    'Sucursales_banca_desarrollo',
+    'Sucursales_cooperativas',
+    'Sucursales_microfinancieras',
+    'Corresponsales',
+    'Cajeros',
+    'Terminales_punto_de_venta',
+    'Establecimientos_con_TPV',
+]
+
+# Row numbers and keys are numeric but are not indicators
+NON_INDICATOR_COLUMNS = ['Unnamed: 0', 'Clave_Estado']
+
+DISTRIBUTION_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+Snapshot = collections.namedtuple('Snapshot', ['level', 'version', 'frame'])
+
+# keys and labels index the rows of old, new, absolute and relative, which are
+# (places x columns) arrays; status is 'added', 'removed' or 'kept' per place
+SnapshotDiff = collections.namedtuple(
+    'SnapshotDiff', ['level', 'keys', 'labels', 'columns', 'old', 'new', 'absolute', 'relative', 'status'])
+
+
+def current_snapshot(level):
+    return Snapshot(level, source_version(level), get_source(level))
+
+
+def read_snapshot(level, data):
+    # data is the content of a release file; its hash is the snapshot version,
+    # computed as for the current sources so an identical file diffs to nothing
+    version = hashlib.sha256(data).hexdigest()[:16]
+    if version == source_version(level):
+        return current_snapshot(level)
+    # Uploaded releases are kept parsed, within the budget of their namespace
+    key = ('snapshot_diff.read_snapshot', level, version)
+    frame = cache_manager.lookup('snapshots', key)
+    if frame is cache_manager.MISSING:
+        frame = SOURCE_READERS[level](io.BytesIO(data))
+        cache_manager.store('snapshots', key, frame)
+    return Snapshot(level, version, frame)
+
+
+def panel_snapshot(period):
+    # A municipal release stored in the quarterly panel, parsed once per panel version
+    version = municipal_release_version(period)
+    key = ('snapshot_diff.read_snapshot', 'municipal', version)
+    frame = cache_manager.lookup('snapshots', key)
+    if frame is cache_manager.MISSING:
+        frame = municipal_release(period)
+        cache_manager.store('snapshots', key, frame)
+    return Snapshot('municipal', version, frame)
+
+
+def snapshot_frame(level, version):
+    if version == source_version(level):
+        return get_source(level)
+    frame = cache_manager.lookup('snapshots', ('snapshot_diff.read_snapshot', level, version))
+    if frame is cache_manager.MISSING:
+        raise KeyError(f'{level} release {version} is no longer cached; read it again')
+    return frame
+
+
+def keyed_frame(level, df):
+    # Rows indexed by INEGI key; the state file's national row has no key
+    if level == 'state':
+        df = df[df['Clave_Estado'].notna()]
+        labels = df.index.astype(str)
+        df = df.set_index(df['Clave_Estado'].astype(int))
+    else:
+        labels = df['Municipio'] + ', ' + df['Estado']
+    if df.index.has_duplicates:
+        raise ValueError(f'{level} release has repeated keys: {list(df.index[df.index.duplicated()][:5])}')
+    return df, pd.Series(np.asarray(labels), index=df.index)
+
+
+def numeric_columns(df):
+    return [col for col, dtype in df.dtypes.items()
+            if shared_cache.is_numeric(dtype) and col not in NON_INDICATOR_COLUMNS]
+
+
+def aligned_values(df, columns, positions):
+    # Rows of df at positions, NaN where the position is -1 (place missing)
+    values = df[columns].to_numpy(dtype=float)
+    return np.where((positions >= 0)[:, None], values[positions], np.nan)
+
+
+@cache_manager.cached('diffs')
+def _snapshot_diff(level, old_version, new_version):
+    old, old_labels = keyed_frame(level, snapshot_frame(level, old_version))
+    new, new_labels = keyed_frame(level, snapshot_frame(level, new_version))
+    new_columns = set(numeric_columns(new))
+    columns = [col for col in numeric_columns(old) if col in new_columns]
+
+    keys = old.index.union(new.index)
+    old_rows = old.index.get_indexer(keys)
+    new_rows = new.index.get_indexer(keys)
+    old_values = aligned_values(old, columns, old_rows)
+    new_values = aligned_values(new, columns, new_rows)
+    absolute = new_values - old_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = absolute / np.abs(old_values)
+    relative[~np.isfinite(relative)] = np.nan
+
+    labels = new_labels.reindex(keys).fillna(old_labels.reindex(keys))
+    status = np.select([old_rows < 0, new_rows < 0], ['added', 'removed'], 'kept')
+    return SnapshotDiff(level, keys, labels.to_numpy(), columns,
+                        old_values, new_values, absolute, relative, status)
+
+
+def snapshot_diff(old, new):
+    return _snapshot_diff(old.level, old.version, new.version)
+
+
+def column_label(col):
+    return labels.label(col)
+
+
+def summary(diff):
+    # One row per column: how many places moved and by how much
+    changed = np.isfinite(diff.absolute) & (diff.absolute != 0)
+    with warnings.catch_warnings():
+        # Columns no place changed in stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return pd.DataFrame({
+            'Places changed': changed.sum(axis=0),
+            'Old total': np.nansum(diff.old, axis=0),
+            'New total': np.nansum(diff.new, axis=0),
+            'Mean change': np.nanmean(np.where(changed, diff.absolute, np.nan), axis=0),
+            'Largest increase': np.nanmax(np.where(changed, diff.absolute, np.nan), axis=0),
+            'Largest decrease': np.nanmin(np.where(changed, diff.absolute, np.nan), axis=0),
+        }, index=[column_label(col) for col in diff.columns])
+
+
+def biggest_movers(diff, column, n=10, relative=False):
+    # Places with the largest absolute (or relative) change of one column
+    j = diff.columns.index(column)
+    change = (diff.relative if relative else diff.absolute)[:, j]
+    order = np.argsort(-np.abs(np.nan_to_num(change, nan=0.0)), kind='stable')
+    rows = order[np.isfinite(change[order]) & (change[order] != 0)][:n]
+    return pd.DataFrame({
+        'Place': diff.labels[rows],
+        'Old': diff.old[rows, j],
+        'New': diff.new[rows, j],
+        'Change': diff.absolute[rows, j],
+        'Change (%)': diff.relative[rows, j] * 100,
+    }, index=diff.keys[rows])
+
+
+def place_changes(diff):
+    # Places only present in one of the releases
+    rows = np.flatnonzero(diff.status != 'kept')
+    return pd.DataFrame({'Place': diff.labels[rows], 'Status': diff.status[rows]}, index=diff.keys[rows])
+
+
+def infrastructure_changes(diff):
+    # Places in both releases that gained their first, or lost their last, unit
+    # of a kind of infrastructure; added and removed places are in place_changes
+    columns = [col for col in INFRASTRUCTURE_COUNT_COLUMNS if col in diff.columns]
+    positions = [diff.columns.index(col) for col in columns]
+    kept = (diff.status == 'kept')[:, None]
+    old = diff.old[:, positions]
+    new = diff.new[:, positions]
+    appeared = kept & (old == 0) & (new > 0)
+    disappeared = kept & (old > 0) & (new == 0)
+    rows, cols = np.nonzero(appeared | disappeared)
+    return pd.DataFrame({
+        'Place': diff.labels[rows],
+        'Infrastructure': np.asarray(columns)[cols],
+        'Change': np.where(appeared[rows, cols], 'new', 'disappeared'),
+        'Old': old[rows, cols],
+        'New': new[rows, cols],
+    }, index=diff.keys[rows])
+
+
+def distribution_shift(diff, columns=None):
+    # Quantiles of each column across places in both releases, all columns at once
+    columns = columns or diff.columns
+    positions = [diff.columns.index(col) for col in columns]
+    names = [f'p{int(q * 100)}' for q in DISTRIBUTION_QUANTILES]
+    frames = []
+    for release, values in [('old', diff.old[:, positions]), ('new', diff.new[:, positions])]:
+        with warnings.catch_warnings():
+            # All-NaN columns (indicators a release leaves empty) stay NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            stats = np.vstack([np.nanmean(values, axis=0), np.nanstd(values, axis=0),
+                               np.nanquantile(values, DISTRIBUTION_QUANTILES, axis=0)])
+        frames.append(pd.DataFrame(stats.T, columns=['mean', 'std'] + names,
+                                   index=[column_label(col) for col in columns]))
+    return pd.concat(frames, axis=1, keys=['old', 'new'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old', help='previous release file')
+    parser.add_argument('new', nargs='?', help='newer release file (default: the current data)')
+    parser.add_argument('--level', choices=LEVELS, default='municipal')
+    parser.add_argument('--top', type=int, default=10, help='movers listed per indicator')
+    options = parser.parse_args()
+
+    with open(options.old, 'rb') as f:
+        old = read_snapshot(options.level, f.read())
+    if options.new:
+        with open(options.new, 'rb') as f:
+            new = read_snapshot(options.level, f.read())
+    else:
+        new = current_snapshot(options.level)
+    diff = snapshot_diff(old, new)
+
+    pd.set_option('display.width', 160)
+    print(f'{options.old} -> {options.new or source_path(options.level)}')
+    print(place_changes(diff).to_string() if (diff.status != 'kept').any() else 'Same places in both releases')
+    changes = summary(diff)
+    print(changes[changes['Places changed'] > 0].to_string())
+    for col in metrics.indicator_labels:
+        if col in diff.columns:
+            movers = biggest_movers(diff, col, options.top)
+            if len(movers):
+                print(f'\n{column_label(col)}')
+                print(movers.to_string())
+    infrastructure = infrastructure_changes(diff)
+    if len(infrastructure):
+        print('\nNew or disappeared infrastructure')
+        print(infrastructure.to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import numpy as np
+
+import cache_manager
+
+
+def test_least_recently_used_entries_are_evicted_over_the_budget(monkeypatch):
+    monkeypatch.setitem(cache_manager._namespaces, 'test', cache_manager.Namespace('test', 3000))
+    for name in ['a', 'b']:
+        cache_manager.store('test', ('f', name), np.zeros(1000, dtype=np.uint8))
+    cache_manager.lookup('test', ('f', 'a'))
+    cache_manager.store('test', ('f', 'c'), np.zeros(1500, dtype=np.uint8))
+    assert cache_manager.lookup('test', ('f', 'b')) is cache_manager.MISSING
+    assert cache_manager.lookup('test', ('f', 'a')) is not cache_manager.MISSING
+    assert cache_manager._namespaces['test'].calls['f'][2] == 1
+
+
+def test_storing_a_new_version_drops_the_old_one(monkeypatch):
+    monkeypatch.setitem(cache_manager._namespaces, 'test', cache_manager.Namespace('test', 1 << 20))
+    cache_manager.store('test', ('f', 'state', 'v1'), 1, versioned=True)
+    cache_manager.store('test', ('f', 'municipal', 'v1'), 2, versioned=True)
+    cache_manager.store('test', ('f', 'state', 'v2'), 3, versioned=True)
+    assert cache_manager.lookup('test', ('f', 'state', 'v1')) is cache_manager.MISSING
+    assert cache_manager.lookup('test', ('f', 'state', 'v2')) == 3
+    assert cache_manager.lookup('test', ('f', 'municipal', 'v1')) == 2
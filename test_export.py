@@ -0,0 +1,28 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export
+
+
+def sample_frame():
+    return pd.DataFrame({'count': np.arange(10), 'rate': np.arange(10) / 4, 'name': list('abcdefghij')},
+                        index=pd.Index(np.arange(100, 110), name='key'))
+
+
+def test_csv_export_of_rows_and_columns_matches_pandas():
+    df = sample_frame()
+    rows = np.array([1, 4, 5, 9])
+    data = b''.join(export.csv_chunks(df, rows, ['name', 'rate'], chunk_rows=3))
+    assert data == df.iloc[rows][['name', 'rate']].to_csv().encode('utf-8')
+    assert export.export_stream(df, 'CSV').read() == df.to_csv().encode('utf-8')
+
+
+def test_parquet_export_round_trips():
+    pytest.importorskip('pyarrow')
+    df = sample_frame()
+    rows = np.array([0, 2, 3, 7, 8])
+    data = export.export_stream(df, 'Parquet', rows, ['count', 'name']).read()
+    pd.testing.assert_frame_equal(pd.read_parquet(io.BytesIO(data)), df.iloc[rows][['count', 'name']])
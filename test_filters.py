@@ -0,0 +1,25 @@
+import numpy as np
+
+import filters
+from data_layer import get_source
+
+
+def test_mask_is_or_within_and_and_across_dimensions():
+    df = get_source('municipal')
+    regions = tuple(df['Region'].dropna().unique()[:2])
+    population_types = tuple(df['Tipo_de_poblacion'].dropna().unique()[:1])
+    place_filter = filters.PlaceFilter(regions, (), population_types)
+    expected = df['Region'].isin(regions) & df['Tipo_de_poblacion'].isin(population_types)
+    mask = filters.filter_mask('municipal', place_filter)
+    np.testing.assert_array_equal(mask, expected.to_numpy())
+    np.testing.assert_array_equal(filters.filter_rows('municipal', place_filter), np.flatnonzero(expected))
+    assert not mask.flags.writeable
+
+
+def test_unknown_values_match_nothing_and_no_filter_keeps_every_row():
+    assert not filters.filter_mask('state', filters.PlaceFilter((), ('Atlantis',), ())).any()
+    assert filters.filter_rows('state', filters.NO_FILTER) is None
+    df = get_source('state')
+    region = df['Region'].dropna().iloc[0]
+    assert filters.narrowed_options('state', 'Estado', filters.PlaceFilter((region,), (), ())) == \
+        sorted(df.index[df['Region'] == region])
@@ -0,0 +1,26 @@
+import numpy as np
+
+import projections
+
+
+def test_fit_uses_window_years_of_annual_points():
+    times = np.arange(2010, 2025, dtype=float)
+    values = np.stack([2.0 * times + 1, 3.0 * times])
+    trend = projections.fit_trends(times, values, window=8)
+    assert list(trend.dof + 2) == [8, 8]
+
+
+def test_fit_uses_window_years_of_quarterly_points():
+    times = 2010 + np.arange(60) / 4
+    values = (5.0 * times)[None, :]
+    trend = projections.fit_trends(times, values, window=3)
+    assert list(trend.dof + 2) == [12]
+
+
+def test_fit_skips_missing_values_in_the_window():
+    times = np.arange(2010, 2025, dtype=float)
+    values = 2.0 * times[None, :]
+    values[0, -2] = np.nan
+    trend = projections.fit_trends(times, values, window=8)
+    assert list(trend.dof + 2) == [7]
+    np.testing.assert_allclose(trend.coef[0], [2.0 * 2024, 2.0])
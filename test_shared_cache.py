@@ -0,0 +1,43 @@
+import os
+import stat
+
+import pytest
+
+import shared_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(shared_cache, 'CACHE_DIR', str(directory))
+    shared_cache.secure_cache_dir.cache_clear()
+    yield directory
+    shared_cache.secure_cache_dir.cache_clear()
+
+
+def test_publish_replaces_older_versions_and_leaves_no_staging_files(cache_dir):
+    assert shared_cache.secure_cache_dir()
+    for name in ['report-a-v1.pkl', 'report-b-v1.pkl']:
+        shared_cache.write_pickle(str(cache_dir / name), 'old')
+    path = str(cache_dir / 'report-a-v2.pkl')
+    shared_cache.publish_entry(path, 'report-a-', lambda staging: shared_cache.write_pickle(staging, 'new'))
+    assert sorted(os.listdir(cache_dir)) == ['report-a-v2.pkl', 'report-b-v1.pkl']
+
+    def fail(staging):
+        shared_cache.write_pickle(staging, 'partial')
+        raise ValueError('interrupted')
+
+    with pytest.raises(ValueError):
+        shared_cache.publish_entry(str(cache_dir / 'report-a-v3.pkl'), 'report-a-', fail)
+    assert sorted(os.listdir(cache_dir)) == ['report-a-v2.pkl', 'report-b-v1.pkl']
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='POSIX permissions')
+def test_cache_writable_by_others_is_not_used(cache_dir):
+    cache_dir.mkdir()
+    cache_dir.chmod(stat.S_IRWXU | stat.S_IRWXG | stat.S_IRWXO)
+    with pytest.warns(UserWarning, match='writable by others'):
+        assert not shared_cache.secure_cache_dir()
+    shared_cache.secure_cache_dir.cache_clear()
+    cache_dir.chmod(stat.S_IRWXU)
+    assert shared_cache.secure_cache_dir()
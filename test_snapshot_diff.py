@@ -0,0 +1,26 @@
+import numpy as np
+
+import snapshot_diff
+from data_layer import get_source
+
+
+def test_releases_are_aligned_on_inegi_keys():
+    current = get_source('municipal')
+    # An earlier release without the first municipality, in another row order,
+    # where one place had one ATM less
+    old = current.iloc[1:].iloc[::-1].copy()
+    changed = old.index[0]
+    old.loc[changed, 'Cajeros'] -= 1
+    diff = snapshot_diff.snapshot_diff(snapshot_diff.read_snapshot('municipal', old.to_csv().encode()),
+                                       snapshot_diff.current_snapshot('municipal'))
+
+    changes = snapshot_diff.place_changes(diff)
+    assert list(changes.index) == [current.index[0]]
+    assert list(changes['Status']) == ['added']
+
+    j = diff.columns.index('Cajeros')
+    row = list(diff.keys).index(changed)
+    assert diff.absolute[row, j] == 1
+    assert np.count_nonzero(np.nan_to_num(diff.absolute[:, j])) == 1
+    movers = snapshot_diff.biggest_movers(diff, 'Cajeros')
+    assert len(movers) == 1
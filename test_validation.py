@@ -0,0 +1,26 @@
+import os
+
+import pandas as pd
+
+import validation
+
+
+def test_rate_check_flags_rows_off_by_more_than_the_tolerance():
+    df = pd.DataFrame({
+        'Poblacion_adulta': [10000, 20000, 5000, None],
+        'Cajeros': ['5', '1,000', '10', '3'],
+        'Cajeros_10mil_adultos': [5.05, 600.0, '20.0', 1.0],
+    }, index=['ok', 'wrong', 'text', 'unknown'])
+    check = validation.rate_check('state', 'Poblacion_adulta', 'Cajeros_10mil_adultos', 'Cajeros')
+    failed = check.evaluate(df)
+    assert list(failed.index) == ['ok', 'wrong', 'text']
+    assert list(failed.index[failed.to_numpy()]) == ['wrong']
+
+
+def test_cached_reports_change_with_the_checking_code(monkeypatch):
+    path = os.path.basename(validation.report_path('state', 'abc'))
+    monkeypatch.setattr(validation, 'CODE_MODULES', ['validation'])
+    other = os.path.basename(validation.report_path('state', 'abc'))
+    assert path != other
+    # Same prefix, so publishing one report removes the other
+    assert path.startswith(validation.report_prefix('state')) and other.startswith(validation.report_prefix('state'))
@@ -0,0 +1,268 @@
+"""Consistency checks on the source files, run when a file changes.
+
+Every check is a vectorized comparison over whole columns of one source: a
+total against the sum of its components, shares against 100%, a per 10,000
+adults rate against count / adult population. Results are cached per source
+file hash, in-process and on disk next to the shared frame cache, so normal
+reruns and freshly started workers never evaluate them again.
+
+``python validation.py`` prints the report.
+"""
+import collections
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import cache_manager
+import shared_cache
+from data_layer import (
+    SOURCE_FILES,
+    STATE_INDICATOR_ALIASES,
+    get_source,
+    source_version,
+    to_number,
+)
+
+# Modules whose code decides what a report holds; changing them recomputes
+# the reports cached on disk
+CODE_MODULES = ['validation', 'data_layer']
+
+# Published figures are rounded; differences below these are not reported
+SUM_TOLERANCE = 1e-3
+SHARE_TOLERANCE = 0.5
+RATE_TOLERANCE = 0.02
+RATE_ABSOLUTE_TOLERANCE = 0.01
+
+# Consecutive yearly totals further apart than this factor look like a unit error
+MAX_YEARLY_CHANGE = 3
+
+# Failing items listed per check in the report
+EXAMPLES = 3
+
+Check = collections.namedtuple('Check', ['source', 'name', 'evaluate'])
+
+REPORT_COLUMNS = ['source', 'check', 'checked', 'failed', 'examples']
+
+
+def mismatch(actual, expected, relative, absolute=0.0):
+    # Boolean Series of failures over the rows where both sides are known
+    known = actual.notna() & expected.notna()
+    actual, expected = actual[known], expected[known]
+    return (actual - expected).abs() > np.maximum(relative * expected.abs(), absolute)
+
+
+# Historical totals and the components they are made of
+HISTORICAL_TOTALS = {
+    'Captación\nBanca_Total': ['Captación\nBanca_Ahorro', 'Captación\nBanca_Plazo',
+                               'Captación\nBanca_Tradicionales', 'Captación\nBanca_Simplificadas'],
+    'Captación\nBanca_Simplificadas': ['Captación\nBanca_N1', 'Captación\nBanca_N2', 'Captación\nBanca_N3'],
+    'Captación\nEACP_Total': ['Captación\nEACP_Ahorro', 'Captación\nEACP_Plazo', 'Captación\nEACP_Vista'],
+    'Crédito\nBanca_Total': ['Crédito\nBanca_Tarjeta de crédito', 'Crédito\nBanca_Personal',
+                             'Crédito\nBanca_Nómina', 'Crédito\nBanca_ABCD', 'Crédito\nBanca_Grupal',
+                             'Crédito\nBanca_Hipotecario', 'Crédito\nBanca_Automotriz'],
+    'Crédito\nEACP_Total': ['Crédito\nEACP_Tarjeta de crédito', 'Crédito\nEACP_Consumo',
+                            'Crédito\nEACP_Vivienda', 'Crédito\nEACP_Comercial'],
+}
+
+
+def historical_total_check(total, components):
+    def evaluate(df):
+        values = df.set_index(df.columns[0])
+        expected = sum(to_number(values[col]) for col in components)
+        return mismatch(to_number(values[total]), expected, SUM_TOLERANCE)
+    return Check('historical', f"{total.replace(chr(10), ' ')} = sum of components", evaluate)
+
+
+def historical_checks():
+    checks = [historical_total_check(total, components) for total, components in HISTORICAL_TOTALS.items()]
+
+    def without_commercial(df):
+        values = df.set_index(df.columns[0])
+        expected = to_number(values['Crédito\nEACP_Total']) - to_number(values['Crédito\nEACP_Comercial'])
+        return mismatch(to_number(values['Crédito\nEACP_Total sin comercial']), expected, SUM_TOLERANCE)
+
+    checks.append(Check('historical', 'Crédito EACP_Total sin comercial = Total - Comercial', without_commercial))
+    return checks
+
+
+# Yearly columns of the Transacciones_*.csv files; the first row is the total
+TRANSACTION_YEARS = ['2022', '2023', '2024 (eoy)']
+
+
+def transaction_checks(source):
+    def shares(df):
+        # One item per year: the category shares should add up to 100%
+        totals = pd.Series({year: to_number(df[f'% {year}'])[1:].sum() for year in TRANSACTION_YEARS})
+        return mismatch(totals, pd.Series(100.0, index=totals.index), 0, SHARE_TOLERANCE)
+
+    def amounts(df):
+        values = pd.DataFrame({year: to_number(df[f'Total {year}']) for year in TRANSACTION_YEARS})
+        return mismatch(values[1:].sum(), values.iloc[0], SUM_TOLERANCE)
+
+    def yearly_scale(df):
+        # One item per category and pair of consecutive years
+        values = pd.DataFrame({year: to_number(df[f'Total {year}']) for year in TRANSACTION_YEARS})
+        values.index = df['Título']
+        ratio = values.iloc[:, 1:].to_numpy() / values.iloc[:, :-1].to_numpy()
+        pairs = [f'{a} -> {b}' for a, b in zip(TRANSACTION_YEARS, TRANSACTION_YEARS[1:])]
+        ratio = pd.DataFrame(ratio, index=values.index, columns=pairs).stack()
+        ratio = ratio[np.isfinite(ratio) & (ratio > 0)]
+        return (ratio > MAX_YEARLY_CHANGE) | (ratio < 1 / MAX_YEARLY_CHANGE)
+
+    return [
+        Check(source, '% shares add up to 100%', shares),
+        Check(source, 'category amounts add up to the total', amounts),
+        Check(source, f'yearly totals change less than {MAX_YEARLY_CHANGE}x', yearly_scale),
+    ]
+
+
+# Per 10,000 adults rates, the counts they are computed from and the adult
+# population of the dataset they come from (rate names as in the municipal file)
+RATE_COUNTS = {
+    'access': {
+        'Sucursales_banca_comercial_10mil_adultos': 'Sucursales_banca_comercial',
+        'Sucursales_banca_desarrollo_10mil_adultos': 'Sucursales_banca_desarrollo',
+        'Sucursales_cooperativas_10mil_adultos': 'Sucursales_cooperativas',
+        'Sucursales_microfinancieras_10mil_adultos': 'Sucursales_microfinancieras',
+        'Total_sucursales_10mil_adultos': 'Total_sucursales',
+        'Corresponsales_10mil_adultos': 'Corresponsales',
+        'Cajeros_10mil_adultos': 'Cajeros',
+        'TPV_10mil_adultos': 'Terminales_punto_de_venta',
+        'Establecimientos_con_TPV_10mil_adultos': 'Establecimientos_con_TPV',
+        'Contratos_celular_10mil_adultos': 'Contratos_celular',
+    },
+    'eacp': {
+        'Cuentas_deposito_ahorro_10mil_adultos_EACP': 'Contratos_deposito_al_ahorro_EACP',
+        'Cuentas_deposito_a_la_vista_10mil_adultos_EACP': 'Contratos_deposito_a_la_vista_EACP',
+        'Cuentas_deposito_a_plazo_10mil_adultos_EACP': 'Contratos_deposito_a_plazo_EACP',
+        'Tarjeta_debito_10mil_adultos_EACP': 'Contratos_tarjeta_debito_EACP',
+        'Cuentas_credito_al_consumo_10mil_adultos_EACP': 'Contratos_credito_al_consumo_EACP',
+        'Cuentas_credito_a_la_vivienda_10mil_adultos_EACP': 'Contratos_credito_a_la_vivienda_EACP',
+    },
+    'banca': {
+        'Cuentas_Nivel1_10mil_adultos_Banca': 'Contratos_cuentas_transaccionales_Nivel_1_Banca',
+        'Cuentas_Nivel2_10mil_adultos_Banca': 'Contratos_cuentas_transaccionales_Nivel_2_Banca',
+        'Cuentas_Nivel3_10mil_adultos_Banca': 'Contratos_cuentas_transaccionales_Nivel_3_Banca',
+        'Cuentas_transaccionales_tradicionales_10mil_adultos_Banca':
+            'Contratos_cuentas_transaccionales_tradicionales_Banca',
+        'Cuentas_ahorro_10mil_adultos_Banca': 'Contratos_cuentas_de_ahorro_Banca',
+        'Cuentas_depositos_plazo_10mil_adultos_Banca': 'Contratos_depositos_a_plazo_Banca',
+        'Tarjetas_debito_10mil_adultos_Banca': 'Contratos_tarjetas_de_debito_Banca',
+        'Tarjetas_credito_10mil_adultos_Banca': 'Contratos_tarjetas_de_credito_Banca',
+        'Creditos_hipotecarios_10mil_adultos_Banca': 'Contratos_hipotecarios_Banca',
+        'Creditos_grupales_10mil_adultos_Banca': 'Contratos_grupales_Banca',
+        'Creditos_personales_10mil_adultos_Banca': 'Contratos_personales_Banca',
+        'Creditos_nomina_10mil_adultos_Banca': 'Contratos_nomina_Banca',
+        'Creditos_automotrices_10mil_adultos_Banca': 'Contratos_automotrices_Banca',
+        'Creditos_ABCD_10mil_adultos_Banca': 'Contratos_ABCD_Banca',
+        'Transacciones_en_TPV_10mil_adultos_Banca': 'Transacciones_en_TPV_Banca',
+        'Transacciones_en_Cajeros_10mil_adultos_Banca': 'Transacciones_en_cajeros_Banca',
+    },
+}
+
+RATE_POPULATIONS = {
+    'state': {'access': 'Poblacion_adulta_accessState',
+              'eacp': 'Poblacion_adulta_eacpUsageState',
+              'banca': 'Poblacion_adulta'},
+    'municipal': {'access': 'Poblacion_adulta_accessMunicipal',
+                  'eacp': 'Poblacion_adulta_eacpUsageMunicipal',
+                  'banca': 'Poblacion_adulta'},
+}
+
+
+def rate_check(level, population, rate, count):
+    def evaluate(df):
+        expected = to_number(df[count]) / to_number(df[population]) * 10000
+        return mismatch(to_number(df[rate]), expected, RATE_TOLERANCE, RATE_ABSOLUTE_TOLERANCE)
+    return Check(level, f'{rate} = {count} / adults x 10,000', evaluate)
+
+
+def rate_checks(level):
+    checks = []
+    for dataset, rates in RATE_COUNTS.items():
+        population = RATE_POPULATIONS[level][dataset]
+        for rate, count in rates.items():
+            if level == 'state':
+                rate = STATE_INDICATOR_ALIASES.get(rate, rate)
+            checks.append(rate_check(level, population, rate, count))
+    return checks
+
+
+def source_checks(name):
+    if name == 'historical':
+        return historical_checks()
+    if name.startswith('transactions_'):
+        return transaction_checks(name)
+    if name in RATE_POPULATIONS:
+        return rate_checks(name)
+    return []
+
+
+def run_checks(name):
+    df = get_source(name)
+    rows = []
+    for check in source_checks(name):
+        try:
+            failed = check.evaluate(df)
+        except KeyError as e:
+            # A renamed column is itself a finding
+            rows.append((name, check.name, 0, 1, f'missing column {e}'))
+            continue
+        examples = ', '.join(' / '.join(map(str, item)) if isinstance(item, tuple) else str(item)
+                             for item in failed.index[failed.to_numpy()][:EXAMPLES])
+        rows.append((name, check.name, len(failed), int(failed.sum()), examples))
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def report_prefix(name):
+    return f'validation-{name}-'
+
+
+def report_path(name, version):
+    return os.path.join(shared_cache.CACHE_DIR,
+                        f'{report_prefix(name)}{shared_cache.code_version(*CODE_MODULES)}-{version}.pkl')
+
+
+@cache_manager.cached('reports', versioned=True)
+def _source_report(name, version):
+    path = report_path(name, version)
+    if shared_cache.enabled():
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+    report = run_checks(name)
+    if shared_cache.enabled():
+        try:
+            # Reports for older versions of the file are no longer needed
+            shared_cache.publish_entry(path, report_prefix(name),
+                                       lambda staging: shared_cache.write_pickle(staging, report))
+        except OSError:
+            pass
+    return report
+
+
+def source_report(name):
+    # Checks only run again when the file's hash changes
+    return _source_report(name, source_version(name))
+
+
+def validation_report():
+    names = [name for name in SOURCE_FILES if source_checks(name)]
+    return pd.concat([source_report(name) for name in names], ignore_index=True)
+
+
+def print_report(report, all_checks=False):
+    failing = report[report['failed'] > 0]
+    print(f'{len(report)} checks, {len(failing)} with failures')
+    for row in (report if all_checks else failing).itertuples(index=False):
+        print(f'  [{row.source}] {row.check}: {row.failed}/{row.checked} failed'
+              + (f' (e.g. {row.examples})' if row.examples else ''))
+
+
+if __name__ == '__main__':
+    print_report(validation_report())
@@ -0,0 +1,139 @@
+"""Warm the data and figure caches, then start the Streamlit server.
+
+Run ``python warmup.py`` instead of ``streamlit run app.py`` so a new replica
+parses every CSV and loads (or renders) the default view before it accepts
+traffic. The caches live in module globals, which the app script shares with
+this launcher because both run in the same process.
+
+Any other arguments are passed on to ``streamlit run``, e.g.
+``python warmup.py --server.port 8080``. ``python warmup.py --check`` only
+warms up and prints the timing report, plus an import-time audit of the
+modules the app pulls in, the data validation report and the cache sizes.
+"""
+import argparse
+import ast
+import importlib
+import os
+import re
+import subprocess
+import sys
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+
+def app_imports(deferred=False):
+    # Top-level modules app.py imports, read from its source so the audit
+    # follows the app as it grows; with deferred, also those imported inside
+    # the sections that use them
+    with open(APP_PATH) as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in ast.walk(tree) if deferred else tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            names.append(node.module)
+    return list(dict.fromkeys(name.split('.')[0] for name in names))
+
+
+def warm_up():
+    stages = []
+
+    def stage(name, fn):
+        start = time.perf_counter()
+        result = fn()
+        stages.append((name, time.perf_counter() - start))
+        return result
+
+    stage('imports', lambda: [importlib.import_module(module) for module in app_imports(deferred=True)])
+
+    import data_layer
+    import figures
+    import prerender
+
+    stage('data sources', data_layer.load_all_sources)
+    stage('validation', lambda: __import__('validation').validation_report())
+    for name in data_layer.DERIVED_BUILDERS:
+        stage(f'derived: {name}', lambda name=name: data_layer.get_derived(name))
+    stage('default view', prerender.load)
+    # Loaded artifacts are only decoded when first asked for; decode them here
+    # so the first visitor doesn't pay for it
+    stage('default view: decode', lambda: [builder(*args) for builder, args in
+                                           figures.default_figures() + figures.default_values()])
+    return stages
+
+
+def import_times(modules):
+    # -X importtime reports per-module self/cumulative microseconds on stderr;
+    # returns (cumulative seconds, module, nested) for every top-level package
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}' if modules else 'pass'],
+        cwd=os.path.dirname(APP_PATH), capture_output=True, text=True, check=True
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        # Only keep top-level packages; nested ones are included in their parent
+        if match and '.' not in match.group(4):
+            timings.append((int(match.group(2)) / 1e6, match.group(4), bool(match.group(3))))
+    return timings
+
+
+def import_audit(top=15, repeats=3):
+    # Slowest imports of a rerun's startup, plus the total import time at
+    # startup and with the modules app.py only imports where it uses them
+    # (best of repeats, leaving out what the interpreter imports by itself)
+    interpreter = {module for _, module, _ in import_times([])}
+
+    def runs(modules):
+        return [[t for t in import_times(modules) if t[1] not in interpreter] for _ in range(repeats)]
+
+    def total(timings):
+        return sum(seconds for seconds, _, nested in timings if not nested)
+
+    startup = runs(app_imports())
+    everything = runs(app_imports(deferred=True))
+    slowest = sorted(((seconds, module) for seconds, module, _ in min(startup, key=total)), reverse=True)[:top]
+    return slowest, min(map(total, startup)), min(map(total, everything))
+
+
+def print_report(stages, audit=None):
+    print('Warm-up stages:')
+    for name, seconds in stages:
+        print(f'  {name:<35} {seconds:8.3f}s')
+    print(f'  {"total":<35} {sum(s for _, s in stages):8.3f}s')
+    if audit:
+        slowest, startup, everything = audit
+        print(f'Imports: {startup:.3f}s at startup, {everything:.3f}s with the deferred modules')
+        print('Slowest top-level imports at startup (cumulative):')
+        for seconds, module in slowest:
+            print(f'  {module:<35} {seconds:8.3f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true',
+                        help='warm up, print the report and the import audit, then exit')
+    options, streamlit_args = parser.parse_known_args()
+
+    stages = warm_up()
+    print_report(stages, import_audit() if options.check else None)
+    if options.check:
+        import cache_manager
+        import validation
+
+        validation.print_report(validation.validation_report())
+        print('Caches after warm-up:')
+        print(cache_manager.namespace_report().to_string())
+        return
+
+    # Start the server in this process so the app script sees the warm caches
+    from streamlit.web import cli
+
+    sys.argv = ['streamlit', 'run', APP_PATH] + streamlit_args
+    cli.main()
+
+
+if __name__ == '__main__':
+    main()